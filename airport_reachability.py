@@ -0,0 +1,259 @@
+#!/usr/bin/python
+
+# IN:  flights data (SOURCE-DEST-DEP-ARR-FLIGHT_NR-PRICE-BAGS_ALLOWED-BAG_PRICE)
+#      airports of countries (airport,country)
+# OUT: airports reachable from airports or from a country within k flights
+#      connection times are not considered, any flight to an airport continues with any flight from it
+#
+#   python airport_reachability.py flights.csv --countries airports.csv --from-country CZ --hops 2
+#
+# Index is saved next to the csv (flights.csv.reach directory) and loaded again while the csv and countries
+# files are not changed.
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from flight_combinations import RoutesFinder
+
+REACH_SUFFIX = '.reach'  # index of flights.csv is saved in flights.csv.reach directory
+INDEX_VERSION = 1
+WORD_BITS = 64
+
+
+def read_countries(countries_file):
+    """ Get {<airport code>: <country>} from csv with header (airport,country). """
+    with open(countries_file, 'rt') as f:
+        return {row['airport']: row['country'] for row in csv.DictReader(f)}
+
+
+class ReachabilityIndex:
+    """ Airports reachable within k flights from every airport, kept as bitsets for every k up to the transitive
+    closure. Airports are interned as ids (indexes of sorted airport codes, same as FlightTable.airports).
+    """
+
+    # arrays of index saved to directory
+    ARRAYS = ['airports', 'offsets', 'neighbours', 'reach', 'countries', 'airport_countries']
+
+    def __init__(self, airports, source, destination, countries=None):
+        """
+        :param airports: sorted airport codes
+        :param source: airport ids of flight departures
+        :param destination: airport ids of flight arrivals
+        :param countries: {<airport code>: <country>}, airports without country are in no country
+        """
+        self.airports = np.asarray(airports, dtype=str)
+        airports_count = len(self.airports)
+
+        # adjacency lists - destinations of airport a are neighbours[offsets[a]:offsets[a + 1]]
+        routes = np.unique(np.asarray(source, dtype=np.int64) * airports_count + np.asarray(destination,
+                                                                                          dtype=np.int64))
+        sources = routes // airports_count
+        self.neighbours = (routes % airports_count).astype(np.int32)
+        self.offsets = np.zeros(airports_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=airports_count), out=self.offsets[1:])
+
+        # reach[k - 1, a] - bits of airports reachable from airport a within k flights
+        self.reach = self.closure()
+
+        # countries[airport_countries[a]] is the country of airport a, -1 for unknown country
+        countries = countries or {}
+        self.countries = np.array(sorted(set(countries.values())), dtype=str)
+        self.airport_countries = np.array([np.searchsorted(self.countries, countries[code])
+                                           if code in countries else -1 for code in self.airports.tolist()],
+                                          dtype=np.int32)
+
+        self.answers = {}  # {(<origin airport ids>, <hops>): <frozenset of airport codes>}
+
+    @classmethod
+    def from_flights(cls, flights, countries=None):
+        """ Create index of routes of FlightTable (cancelled flights are left out). """
+        indexes = flights.indexes()
+
+        return cls(flights.airports, flights.source[indexes], flights.destination[indexes], countries)
+
+    @classmethod
+    def from_routes(cls, routes, countries=None):
+        """ Create index of {<airport code>: [<destination airport code>, ...]} (czech_ryanair in dictionaries.py). """
+        pairs = [(source, destination) for source, destinations in routes.items() for destination in destinations]
+        airports = np.unique(np.array(list(routes) + [destination for _, destination in pairs], dtype=str))
+        source = np.searchsorted(airports, np.array([source for source, _ in pairs], dtype=str))
+        destination = np.searchsorted(airports, np.array([destination for _, destination in pairs], dtype=str))
+
+        return cls(airports, source, destination, countries)
+
+    def closure(self):
+        """ Get bitsets of airports reachable within 1, 2, ... flights until no more airports are reached. """
+        airports_count = len(self.airports)
+        words = max(1, -(-airports_count // WORD_BITS))
+        sources = np.repeat(np.arange(airports_count), np.diff(self.offsets))
+
+        direct = np.zeros((airports_count, words), dtype=np.uint64)
+        np.bitwise_or.at(direct, (sources, self.neighbours // WORD_BITS),
+                         np.left_shift(np.uint64(1), (self.neighbours % WORD_BITS).astype(np.uint64)))
+
+        levels = [direct]
+        connected = np.flatnonzero(np.diff(self.offsets))  # airports with departing flights
+
+        while len(connected):
+            # within k + 1 flights: direct destinations and airports reachable from them within k flights
+            following = direct.copy()
+            following[connected] |= np.bitwise_or.reduceat(levels[-1][self.neighbours], self.offsets[connected],
+                                                           axis=0)
+
+            if np.array_equal(following, levels[-1]):
+                break
+
+            levels.append(following)
+
+        return np.stack(levels)
+
+    def save(self, directory):
+        """ Save all arrays of index to directory, one .npy file per array. """
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """ Load index saved by save. Arrays are memory-mapped from their files. """
+        index = cls.__new__(cls)
+
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+
+        index.answers = {}
+
+        return index
+
+    def airport_ids(self, airports):
+        """ Get ids of known airport codes. """
+        airports = np.array(sorted(set(airports)), dtype=str)
+        ids = np.searchsorted(self.airports, airports)
+
+        known = ids < len(self.airports)
+        known[known] = self.airports[ids[known]] == airports[known]
+
+        return ids[known]
+
+    def reachable_ids(self, ids, hops=None):
+        """
+        Get codes of airports reachable from airport ids.
+        :param hops: maximal number of flights, any number without it
+        :return frozenset of airport codes, the same set for the same ids and hops
+        """
+        key = (tuple(ids), hops)
+        answer = self.answers.get(key)
+
+        if answer is None:
+            if hops is not None and hops < 1 or not len(ids):
+                answer = frozenset()
+            else:
+                level = self.reach[len(self.reach) - 1 if hops is None else min(hops, len(self.reach)) - 1]
+                bits = np.bitwise_or.reduce(level[list(ids)], axis=0)
+                # bit b of word w is airport w * WORD_BITS + b
+                bits = np.unpackbits(bits.astype('<u8').view(np.uint8), bitorder='little')
+                reached = np.flatnonzero(bits[:len(self.airports)])
+                answer = frozenset(self.airports[reached].tolist())
+
+            self.answers[key] = answer
+
+        return answer
+
+    def reachable(self, airports, hops=None):
+        """ Get codes of airports reachable from any of airport codes within hops flights, see reachable_ids. """
+        return self.reachable_ids(self.airport_ids(airports).tolist(), hops)
+
+    def reachable_from_country(self, country, hops=None):
+        """ Get codes of airports reachable from any airport of country within hops flights, see reachable_ids. """
+        country_id = np.searchsorted(self.countries, country)
+
+        if country_id == len(self.countries) or self.countries[country_id] != country:
+            return frozenset()
+
+        return self.reachable_ids(np.flatnonzero(self.airport_countries == country_id).tolist(), hops)
+
+
+def file_key(file_name):
+    """ Get size and modification time of file, index is rebuilt when they change. """
+    stat = os.stat(file_name)
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_index(csv_file, countries_file=None, cache=True):
+    """ Load index of flights csv from its cache directory, or create it (and save it to cache). """
+    index_dir = csv_file + REACH_SUFFIX
+    key_file = os.path.join(index_dir, 'key.json')
+
+    try:
+        key = {"version": INDEX_VERSION, "csv": file_key(csv_file),
+               "countries": file_key(countries_file) if countries_file else None}
+    except OSError as e:
+        sys.exit('Cannot open file {}. {}'.format(e.filename, e))
+
+    if cache:
+        try:
+            with open(key_file, 'rt') as f:
+                if json.load(f) == key:
+                    return ReachabilityIndex.load(index_dir)
+        except (OSError, ValueError):
+            pass
+
+    finder = RoutesFinder()
+
+    try:
+        countries = read_countries(countries_file) if countries_file else None
+    except (OSError, KeyError, csv.Error) as e:
+        sys.exit('Cannot read countries {}. {}'.format(countries_file, e))
+
+    index = ReachabilityIndex.from_flights(finder.load_csv(csv_file), countries)
+
+    if cache:
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+
+            # index is invalid until the new key is saved
+            if os.path.exists(key_file):
+                os.remove(key_file)
+
+            index.save(index_dir)
+            finder.save_cache_key(key_file, key)
+        except OSError as e:
+            sys.stderr.write('Cannot save reachability index {}. {}\n'.format(index_dir, e))
+
+    return index
+
+
+def parse_input():
+    parser = argparse.ArgumentParser(description="Airports reachable by flights.")
+    parser.add_argument("input_csv", help="Input *.csv file path")
+    parser.add_argument("--countries", metavar="FILE",
+                        help="Csv file of airport countries with header (airport,country)")
+    parser.add_argument("--from", dest="source", nargs='+', default=[], help="Airport codes of departure")
+    parser.add_argument("--from-country", help="Country of departure airports")
+    parser.add_argument("--hops", type=int, help="Maximal number of flights, any number by default")
+    parser.add_argument("--no-cache", action="store_true", help="Do not load nor save index next to the csv file")
+
+    args = parser.parse_args()
+
+    if not args.source and args.from_country is None:
+        parser.error("--from or --from-country is required")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_input()
+    index = load_index(args.input_csv, args.countries, not args.no_cache)
+
+    reachable = index.reachable(args.source, args.hops)
+
+    if args.from_country is not None:
+        reachable = reachable | index.reachable_from_country(args.from_country, args.hops)
+
+    print(json.dumps({"from": args.source, "from_country": args.from_country, "hops": args.hops,
+                      "airports": sorted(reachable)}, indent=4, separators=(',', ':')))
@@ -1,4 +1,8 @@
+import argparse
 import random
+import time
+
+import numpy as np
 
 intro_text = """
 Hi there!
@@ -11,21 +15,36 @@ Correct, you've guessed the right number in {} guesse(s)!
 That's {}!
 """
 
+DIGITS = 10
+# number of digits in every mask of digits (bit d is set for digit d)
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(1 << DIGITS)], dtype=np.uint8)
+MAX_TABLE_SIZE = 32 * 2 ** 20  # bytes of precomputed score table, 4536 x 4536 scores of 4 digit numbers fit
+MAX_SCORES = 2 ** 25  # scores computed to choose one guess
+TABLE_CHUNK = 256  # rows of score table computed at once
+
+# first guesses for secrets longer than 4 digits, the same as Solver.guess chooses with MAX_SCORES
+OPENINGS = {'minimax': {5: '12364', 6: '127365', 7: '1023456', 8: '38562471', 9: '102345678', 10: '1023456789'},
+            'entropy': {5: '10234', 6: '102345', 7: '1248659', 8: '38562471', 9: '198765432', 10: '1023456789'}}
+
 
-def generate_number(num_length):
-    """Computer generatet 4-digit number with different digits."""
+def generate_number(num_length, rng=random):
+    """Computer generatet 4-digit number with different digits.
+    :param rng: random generator, random.Random(seed) gives the same numbers for the same seed
+    """
     assert num_length <= 10
 
     numbers = list(range(10))
 
     while numbers[0] == 0:
-        random.shuffle(numbers)
+        rng.shuffle(numbers)
 
     return "".join(str(number) for number in numbers[:num_length])
 
 
 def check_numbers(user_number, secret_number):
-    """Check user guess"""
+    """Check user guess
+    :return tuple of (bulls, cows)
+    """
     bulls = 0
     cows = 0
 
@@ -37,10 +56,7 @@ def check_numbers(user_number, secret_number):
         elif number in secret_number:
             cows += 1
 
-    if bulls == 4:
-        return True
-
-    print("{} bulls, {} cows".format(bulls, cows))
+    return bulls, cows
 
 
 def check_status(guesses):
@@ -56,23 +72,311 @@ def check_status(guesses):
     return status
 
 
+class Game:
+    """ Bulls and cows game without input(); guesses are scored by check_numbers. """
+
+    def __init__(self, num_length=4, rng=random, secret_number=None):
+        """
+        :param rng: random generator of secret number
+        :param secret_number: secret number instead of generated one
+        """
+        self.num_length = num_length
+        self.secret_number = secret_number or generate_number(num_length, rng)
+        self.guesses = []  # [(<guess>, <bulls>, <cows>),...]
+
+    def guess(self, user_number):
+        """
+        Score user guess.
+        :return tuple of (bulls, cows)
+        """
+        if len(user_number) != self.num_length or not user_number.isdigit():
+            raise ValueError("{} is not a {} digit number.".format(user_number, self.num_length))
+
+        bulls, cows = check_numbers(user_number, self.secret_number)
+        self.guesses.append((user_number, bulls, cows))
+
+        return bulls, cows
+
+    @property
+    def solved(self):
+        return bool(self.guesses) and self.guesses[-1][1] == self.num_length
+
+    def status(self):
+        return check_status(len(self.guesses))
+
+
+def valid_digits(num_length):
+    """
+    Get digits of all numbers generate_number can give - different digits, no leading zero.
+    :return tuple of numpy arrays - digits [number, position] of numbers in increasing order, masks of their digits
+    """
+    assert 1 <= num_length <= DIGITS
+
+    columns = [np.arange(1, DIGITS, dtype=np.uint8)]
+    masks = np.left_shift(1, columns[0], dtype=np.uint16)
+
+    for used in range(1, num_length):
+        # unused[mask] - increasing digits missing in mask of used digits, so numbers stay in increasing order
+        unused = np.array([[digit for digit in range(DIGITS) if not mask >> digit & 1][:DIGITS - used]
+                           if POPCOUNT[mask] == used else [0] * (DIGITS - used) for mask in range(1 << DIGITS)],
+                          dtype=np.uint8)
+        following = unused[masks].ravel()
+        rows = np.repeat(np.arange(len(masks)), DIGITS - used)
+
+        columns = [column[rows] for column in columns] + [following]
+        masks = masks[rows] | np.left_shift(1, following, dtype=np.uint16)
+
+    return np.column_stack(columns), masks
+
+
+class Solver:
+    """ Bulls and cows solver; guesses are scored for all candidate numbers at once by numpy. """
+
+    STRATEGIES = ('minimax', 'entropy', 'random')
+
+    def __init__(self, num_length=4, strategy='minimax', max_table_size=MAX_TABLE_SIZE, max_scores=MAX_SCORES,
+                 rng=random):
+        """
+        :param num_length: length of secret number, up to 10
+        :param strategy: 'minimax' - guess leaving the least candidates in the worst case,
+                         'entropy' - guess giving the most information on average,
+                         'random' - random candidate, like a player who only guesses numbers which can be the secret
+        :param max_table_size: maximal bytes of precomputed score table, scores are computed for every guess without it
+        :param max_scores: maximal number of scores computed to choose a guess, less guesses are tried for more
+                           candidates
+        :param rng: random generator of 'random' strategy
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError("Unknown strategy '{}', choose one of {}.".format(strategy, ", ".join(self.STRATEGIES)))
+
+        if not 1 <= num_length <= DIGITS:
+            raise ValueError("Length of secret number must be between 1 and {}.".format(DIGITS))
+
+        self.num_length = num_length
+        self.strategy = strategy
+        self.max_scores = max_scores
+        self.rng = rng
+
+        # digits[i, position] and mask of digits of numbers[i]
+        self.digits, self.masks = valid_digits(num_length)
+        self.numbers = np.zeros(len(self.digits), dtype=np.int64)
+
+        for position in range(num_length):
+            self.numbers = self.numbers * 10 + self.digits[:, position]
+
+        self.score_count = (num_length + 1) ** 2
+        self.win = self.score(num_length, 0)
+        self.table = self.score_table() if len(self.numbers) ** 2 <= max_table_size else None
+        self.decisions = {}  # {<scores of previous guesses>: <guess>}, guesses depend only on previous scores
+
+        opening = OPENINGS.get(strategy, {}).get(num_length)
+
+        if opening is not None and max_scores == MAX_SCORES:
+            self.decisions[()] = self.index(opening)
+
+    def score(self, bulls, cows):
+        """ Get score code of bulls and cows, score codes index arrays of partitions. """
+        return bulls * (self.num_length + 1) + cows
+
+    def compute_scores(self, guesses, candidates):
+        """
+        Get scores of guesses for candidate secrets.
+        :param guesses: indexes of guesses in numbers
+        :param candidates: indexes of candidate secrets in numbers
+        :return numpy array of score codes [guess, candidate]
+        """
+        guesses = np.asarray(guesses)[:, np.newaxis]
+
+        bulls = np.zeros((len(guesses), len(candidates)), dtype=np.uint8)
+
+        for position in range(self.num_length):
+            bulls += self.digits[guesses, position] == self.digits[candidates, position]
+
+        common = POPCOUNT[self.masks[guesses] & self.masks[candidates]]
+
+        # cows are common digits which are not bulls
+        return bulls * np.uint8(self.num_length) + common
+
+    def score_table(self):
+        """ Get scores of every number as guess for every number as secret. """
+        candidates = np.arange(len(self.numbers))
+        table = np.empty((len(self.numbers), len(self.numbers)), dtype=np.uint8)
+
+        for start in range(0, len(self.numbers), TABLE_CHUNK):
+            table[start:start + TABLE_CHUNK] = self.compute_scores(candidates[start:start + TABLE_CHUNK], candidates)
+
+        return table
+
+    def scores(self, guesses, candidates):
+        """ Get scores of guesses for candidates from score table or computed. """
+        if self.table is not None:
+            return self.table[np.ix_(guesses, candidates)]
+
+        return self.compute_scores(guesses, candidates)
+
+    def number(self, index):
+        return str(self.numbers[index])
+
+    def index(self, number):
+        """ Get index of number, ValueError if generate_number can not give it. """
+        index = int(np.searchsorted(self.numbers, int(number))) if number.isdigit() else len(self.numbers)
+
+        if len(number) != self.num_length or index == len(self.numbers) or self.number(index) != number:
+            raise ValueError("{} is not a {} digit number with different digits.".format(number, self.num_length))
+
+        return index
+
+    def candidates(self):
+        """ Get indexes of all candidate secrets before the first guess. """
+        return np.arange(len(self.numbers))
+
+    def filter(self, candidates, guess, bulls, cows):
+        """ Get candidates which give the same bulls and cows for guess. """
+        return candidates[self.scores([guess], candidates)[0] == self.score(bulls, cows)]
+
+    def guess_pool(self, candidates):
+        """ Get guesses to try; all numbers while scores fit max_scores, then evenly spread candidates. """
+        if self.table is not None and len(self.numbers) * len(candidates) <= self.max_scores:
+            return np.arange(len(self.numbers))
+
+        count = max(1, self.max_scores // len(candidates))
+
+        if count >= len(candidates):
+            return candidates
+
+        return candidates[np.linspace(0, len(candidates) - 1, count).astype(np.int64)]
+
+    def partitions(self, guesses, candidates):
+        """ Get numbers of candidates left after every score of every guess, array [guess, score]. """
+        sizes = np.empty((len(guesses), self.score_count), dtype=np.int64)
+        chunk = max(1, self.max_scores // 8 // len(candidates))
+
+        for start in range(0, len(guesses), chunk):
+            scores = self.scores(guesses[start:start + chunk], candidates)
+            offsets = scores + np.arange(len(scores))[:, np.newaxis] * self.score_count
+            sizes[start:start + chunk] = np.bincount(offsets.ravel(), minlength=len(scores) * self.score_count
+                                                     ).reshape(len(scores), self.score_count)
+
+        return sizes
+
+    def guess(self, candidates):
+        """
+        Choose the next guess by strategy; of equal guesses the one which can be the secret wins.
+        :param candidates: indexes of candidate secrets
+        :return index of guess
+        """
+        if self.strategy == 'random':
+            return int(candidates[self.rng.randrange(len(candidates))])
+
+        if len(candidates) <= 2:
+            return int(candidates[0])
+
+        guesses = self.guess_pool(candidates)
+        sizes = self.partitions(guesses, candidates)
+
+        if self.strategy == 'minimax':
+            cost = sizes.max(axis=1)
+        else:
+            # the least expected information left, sum of size * log(size) of partitions
+            cost = np.round((sizes * np.log2(np.maximum(sizes, 1))).sum(axis=1), 9)
+
+        impossible = ~np.isin(guesses, candidates)
+
+        return int(guesses[np.lexsort((impossible, cost))[0]])
+
+    def next_guess(self, scores, candidates):
+        """
+        Get guess after previous scores, chosen guesses are remembered, so every next game is faster.
+        :param scores: tuple of score codes of previous guesses
+        :param candidates: indexes of candidate secrets left after previous guesses
+        :return index of guess
+        """
+        if self.strategy == 'random':
+            return self.guess(candidates)
+
+        guess = self.decisions.get(scores)
+
+        if guess is None:
+            guess = self.decisions[scores] = self.guess(candidates)
+
+        return guess
+
+    def play(self, game):
+        """
+        Guess secret number of game until it is solved.
+        :return number of guesses
+        """
+        candidates = self.candidates()
+        scores = ()
+
+        while not game.solved:
+            guess = self.next_guess(scores, candidates)
+            bulls, cows = game.guess(self.number(guess))
+
+            candidates = self.filter(candidates, guess, bulls, cows)
+            scores += (self.score(bulls, cows),)
+
+        return len(game.guesses)
+
+    def solve(self, secret_number):
+        """
+        Guess secret number.
+        :return list of (guess, bulls, cows), the last guess is secret number
+        """
+        self.index(secret_number)
+
+        game = Game(self.num_length, secret_number=secret_number)
+        self.play(game)
+
+        return game.guesses
+
+
+def parse_input():
+    parser = argparse.ArgumentParser(description="Bulls and cows game.")
+    parser.add_argument("--solve", metavar="NUMBER", help="Let solver guess the number instead of playing")
+    parser.add_argument("--strategy", choices=Solver.STRATEGIES, default='minimax', help="Strategy of solver")
+
+    return parser.parse_args()
+
+
+def solve(secret_number, strategy):
+    start = time.perf_counter()
+
+    try:
+        solver = Solver(len(secret_number), strategy)
+        prepared = time.perf_counter()
+        guesses = solver.solve(secret_number)
+    except ValueError as e:
+        exit(e)
+
+    for guess, bulls, cows in guesses:
+        print("{}: {} bulls, {} cows".format(guess, bulls, cows))
+
+    print("Solved in {} guesse(s), {:.3f} s (+ {:.3f} s to prepare).".format(
+        len(guesses), time.perf_counter() - prepared, prepared - start))
+
+
 if __name__ == "__main__":
+    args = parse_input()
 
-    user_number = None
-    guesses = 0
+    if args.solve:
+        solve(args.solve, args.strategy)
+        exit()
 
-    secret_number = generate_number(4)
+    game = Game(4)
     print(intro_text)
 
     # user guess
-    while user_number != secret_number:
+    while not game.solved:
         user_number = input('Enter a number:')
-        if len(user_number) == 4 and user_number.isdigit():
-            check_numbers(user_number, secret_number)
-            guesses += 1
-        else:
+
+        try:
+            bulls, cows = game.guess(user_number)
+        except ValueError:
             print("Hmmm, that's interesting guess. Try to use a 4-digit number ;)")
+            continue
 
-    status = check_status(guesses)
+        if not game.solved:
+            print("{} bulls, {} cows".format(bulls, cows))
 
-    print(end_text.format(guesses, status))
+    print(end_text.format(len(game.guesses), game.status()))
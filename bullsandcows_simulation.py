@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+# Monte Carlo simulation of bulls and cows games played by bullsandcows.Solver strategies.
+#
+#   python bullsandcows_simulation.py --games 1000000 --strategies minimax entropy random --workers 4 --seed 0
+#
+# Games are split into chunks with their own seeded random generators (secret numbers, 'random' strategy),
+# so results of a seed do not depend on the number of workers. Prints json with histograms of guesses,
+# statuses of check_status and games per second of every strategy.
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from bullsandcows import Game, Solver, check_status
+
+DEFAULT_CHUNK_SIZE = 10000
+
+solver = None  # Solver of worker process, its score table and remembered guesses are reused by all chunks
+
+
+def init_worker(num_length, strategy):
+    global solver
+    solver = Solver(num_length, strategy)
+
+
+def play_chunk(params):
+    """
+    Play games of one chunk in worker.
+    :param params: tuple of (seed, number of games)
+    :return Counter of {<number of guesses>: <number of games>}
+    """
+    seed, games = params
+    rng = random.Random(seed)
+    solver.rng = rng
+    histogram = Counter()
+
+    for _ in range(games):
+        histogram[solver.play(Game(solver.num_length, rng))] += 1
+
+    return histogram
+
+
+class Simulation:
+    """ Play many games of strategy in a process pool. """
+
+    def __init__(self, num_length=4, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.num_length = num_length
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def chunks(self, games, seed):
+        """ Get (seed, number of games) of every chunk; seeds of chunks are given by seed. """
+        rng = random.Random(seed)
+
+        return [(rng.getrandbits(64), min(self.chunk_size, games - start))
+                for start in range(0, games, self.chunk_size)]
+
+    def run(self, strategy, games, seed=0):
+        """
+        Play games with strategy.
+        :return dict of results
+        """
+        start = time.perf_counter()
+
+        with Pool(self.workers, init_worker, (self.num_length, strategy)) as pool:
+            histogram = sum(pool.imap(play_chunk, self.chunks(games, seed)), Counter())
+
+        seconds = time.perf_counter() - start
+        statuses = Counter()
+
+        for guesses, count in histogram.items():
+            statuses[check_status(guesses)] += count
+
+        return {"strategy": strategy,
+                "games": games,
+                "mean_guesses": round(sum(guesses * count for guesses, count in histogram.items()) / games, 4),
+                "max_guesses": max(histogram),
+                "histogram": {str(guesses): histogram[guesses] for guesses in sorted(histogram)},
+                "statuses": dict(statuses),
+                "seconds": round(seconds, 3),
+                "games_per_second": round(games / seconds, 1)}
+
+
+def parse_input():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of bulls and cows strategies.")
+    parser.add_argument("--games", type=int, default=100000, help="Number of games of every strategy")
+    parser.add_argument("--strategies", nargs='+', choices=Solver.STRATEGIES, default=list(Solver.STRATEGIES),
+                        help="Simulated strategies")
+    parser.add_argument("--length", type=int, default=4, help="Length of secret number, up to 10")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes playing games")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Games of one seeded chunk")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of random generators")
+
+    args = parser.parse_args()
+
+    if args.games < 1 or args.workers < 1 or args.chunk_size < 1:
+        parser.error("--games, --workers and --chunk-size must be positive")
+
+    if not 1 <= args.length <= 10:
+        parser.error("--length must be between 1 and 10")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_input()
+    simulation = Simulation(args.length, args.workers, args.chunk_size)
+
+    try:
+        results = [simulation.run(strategy, args.games, args.seed) for strategy in args.strategies]
+    except (ValueError, OSError) as e:
+        sys.exit(e)
+
+    print(json.dumps({"length": args.length, "seed": args.seed, "workers": args.workers, "chunk_size": args.chunk_size,
+                      "results": results}, indent=4, separators=(',', ':')))
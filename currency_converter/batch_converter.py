@@ -0,0 +1,145 @@
+import csv
+import json
+import logging
+from itertools import islice
+
+import numpy as np
+
+from currency_map import currencies
+
+"""
+BATCH CONVERTER
+===============
+IN: records of amount, input currency and output currency - csv file with header (amount,from,to)
+    or ndjson file ({"amount": <float>, "from": <3 letter currency code>, "to": <3 letter currency code>} per line)
+
+FUNCTIONALITY: Cross rates of all currencies are computed once from rates for one base currency (fixer or ECB).
+               Records are converted in chunks by numpy and rounded to decimal digits of output currency.
+
+OUT: same records with converted amount ("amount", "from", "to", "result") in the same format,
+     result is empty (null) for unknown currency or invalid amount
+"""
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_DECIMAL_DIGITS = 2
+CSV_FIELDS = ['amount', 'from', 'to']
+
+logger = logging.getLogger(__name__)
+
+
+class RateMatrix:
+    def __init__(self, rates):
+        """
+        :param rates: dictionary of {'base': <currency_code>, 'rates': {<currency_code>: <currency_rate>,...}}
+        """
+
+        base_rates = dict(rates['rates'])
+        base_rates[rates['base']] = 1.0
+
+        self.codes = sorted(base_rates)  # ["AUD", "BGN", ...]
+        self.indexes = {code: index for index, code in enumerate(self.codes)}  # {"AUD": 0, ...}
+
+        rates_vector = np.array([base_rates[code] for code in self.codes], dtype=np.float64)
+
+        # matrix[i, j] is rate of currency j for currency i
+        self.matrix = rates_vector[np.newaxis, :] / rates_vector[:, np.newaxis]
+
+        digits = np.array([currencies[code]["decimal_digits"] if code in currencies else DEFAULT_DECIMAL_DIGITS
+                           for code in self.codes])
+        self.scales = 10.0 ** digits  # rounding scale of currency
+
+    def currency_indexes(self, codes):
+        """
+        Get indexes of currency codes in matrix.
+        :return numpy array of indexes, -1 for unknown currency
+        """
+
+        return np.fromiter((self.indexes.get(code.upper(), -1) if isinstance(code, str) else -1 for code in codes),
+                           dtype=np.int64, count=len(codes))
+
+    def convert(self, amounts, input_currencies, output_currencies):
+        """
+        Convert amounts from input to output currencies, rounded to decimal digits of output currency.
+        :return numpy array of converted amounts, nan for unknown currency or invalid amount
+        """
+
+        amounts = np.asarray(amounts, dtype=np.float64)
+        rows = self.currency_indexes(input_currencies)
+        columns = self.currency_indexes(output_currencies)
+
+        valid = (rows >= 0) & (columns >= 0)
+        result = np.full(len(amounts), np.nan)
+
+        scales = self.scales[columns[valid]]
+        result[valid] = np.round(amounts[valid] * self.matrix[rows[valid], columns[valid]] * scales) / scales
+
+        return result
+
+
+def parse_amount(amount):
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def read_csv_records(lines):
+    """Generate records (amount, from, to) from csv lines with header."""
+
+    for row in csv.DictReader(lines):
+        yield parse_amount(row.get('amount')), row.get('from'), row.get('to')
+
+
+def read_ndjson_records(lines):
+    """Generate records (amount, from, to) from json lines; invalid lines give invalid records."""
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+            yield parse_amount(record.get('amount')), record.get('from'), record.get('to')
+        except (ValueError, AttributeError):
+            logger.warning("Invalid json record on line %s.", line_number)
+            yield np.nan, None, None
+
+
+def convert_records(rate_matrix, records, output, output_format='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Convert records in chunks and write them with results to output.
+    :param records: iterable of records (amount, from, to)
+    :param output: writable text file
+    :return number of converted records
+    """
+
+    records = iter(records)
+    writer = None
+    count = 0
+
+    if output_format == 'csv':
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(CSV_FIELDS + ['result'])
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+
+        if not chunk:
+            return count
+
+        amounts, input_currencies, output_currencies = zip(*chunk)
+        results = rate_matrix.convert(amounts, input_currencies, output_currencies)
+
+        # nan to None
+        amounts = [None if amount != amount else amount for amount in amounts]
+        results = [None if result != result else result for result in results.tolist()]
+
+        if writer:
+            writer.writerows(zip(amounts, input_currencies, output_currencies, results))  # None is written empty
+        else:
+            output.writelines(json.dumps({"amount": amount, "from": input_currency, "to": output_currency,
+                                          "result": result}) + '\n'
+                              for amount, input_currency, output_currency, result
+                              in zip(amounts, input_currencies, output_currencies, results))
+
+        count += len(chunk)
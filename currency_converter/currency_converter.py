@@ -1,11 +1,15 @@
 #!/usr/bin/python3
 
-import argparse
 import json
 import logging
-import requests
-import xml.etree.ElementTree as ET
-from currency_map import currencies
+import os
+import sys
+import threading
+from currency_map import currencies, symbol_codes
+from rates_cache import DEFAULT_CACHE_DIR, DEFAULT_TTL, RatesCache
+
+# modules needed only for obtaining rates (requests, xml), batches and history (numpy) or commandline parameters
+# (argparse) are imported when they are used, so conversion with cached rates starts fast
 
 """
 CURRENCY CONVERTER
@@ -14,8 +18,14 @@ IN: amount - amount which we want to convert - float
     input_currency - input currency - 3 letters name or currency symbol
     output_currency - requested/output currency - 3 letters name or currency symbol
 
+    date - date of rates (YYYY-MM-DD) from historical rates store, see historical_rates.py
+    batch - csv or ndjson file of records (amount, input currency, output currency), see batch_converter.py
+
 FUNCTIONALITY: If output_currency param is missing, convert to all known currencies.
-               Fixer api is used to obtain currency rates. If it is not available, ECB rates are used.
+               Fixer api is used to obtain currency rates. If it does not answer in hedge delay or fails,
+               ECB is asked too and the first obtained rates are used.
+               Obtained rates are cached (see rates_cache.py) unless --no_cache is given.
+               Conversion with cached rates imports neither requests nor xml nor numpy.
 
 OUT: json
      example:
@@ -29,6 +39,10 @@ OUT: json
                 }
               }
 
+LIBRARY: converter obtains rates once and can be used for any number of conversions from many threads
+         converter = CurrencyConverter(RatesCache())
+         converter.convert(10, 'CZK', 'USD')  # output as above
+
 currency map used from http://www.localeplanet.com/api/auto/currencymap.json
 """
 
@@ -38,69 +52,98 @@ ECB_NAMESPACES = {'gesmes': 'http://www.gesmes.org/xml/2002-08-01',
                   'rates': 'http://www.ecb.int/vocabulary/2002-08-01/eurofxref'}
 ECB_DEFAULT_BASE = 'EUR'
 
+DEFAULT_TIMEOUT = 5  # seconds to connect and to read response
+DEFAULT_HEDGE_DELAY = 0.5  # seconds to wait for fixer before asking ECB too
+POOL_SIZE = 10  # kept-alive connections per host
+DEFAULT_HISTORY_DIR = os.path.join(DEFAULT_CACHE_DIR, 'history')
+
+logger = logging.getLogger(__name__)
+
+
+class CurrencyError(ValueError):
+    """Currency is not supported or its symbol is ambiguous."""
+
+
+class RatesError(RuntimeError):
+    """Currency rates could not be obtained."""
+
 
 class CurrencyConverter:
-    def __init__(self):
-        self.args = None
-        self.parser = None
-        self.rates = None
-        self.conversion = {"input": {}, "output": {}}
-        self.symbols_map = {currency[0]: currency[1]["symbol_native"] for currency in
-                            currencies.items()}  # {"USD": "$", ...}
-
-    def check_currency(self, currency):
+    def __init__(self, rates_cache=None, timeout=DEFAULT_TIMEOUT, hedge_delay=DEFAULT_HEDGE_DELAY, history=None):
+        """
+        :param rates_cache: RatesCache, rates are obtained only once for the converter without it
+        :param timeout: seconds to wait for connection to and response of rates source
+        :param hedge_delay: seconds to wait for fixer before asking ECB too, 0 to ask both at once
+        :param history: HistoricalRates for conversions with date
+        """
+
+        self.rates_cache = rates_cache
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.history = history
+        self.session = None  # requests.Session, created with the first request
+        self.session_lock = threading.Lock()
+        self.lock = threading.Lock()  # rates are obtained by one thread at a time
+        self.rates = None  # rates of all currencies same as get_json_rates or parse_xml_rates
+        self.expires = 0  # time until rates are used without asking rates cache
+        self.rate_matrix = None  # batch_converter.RateMatrix of rates
+
+    @staticmethod
+    def check_currency(currency):
         """Check if 3 letters currency name or symbol exist.
-        :param currency: commandline parameter for input/output currency
+        :param currency: input/output currency
         :return currency code
         """
 
-        if len(currency) == 3 and currency.upper() in currencies.keys():
+        if len(currency) == 3 and currency.upper() in currencies:
             return currency.upper()
-        elif currency in self.symbols_map.values():
+        elif currency in symbol_codes:
             # get codes for symbol
-            codes = [code for code, symbol in self.symbols_map.items() if symbol == currency]
+            codes = symbol_codes[currency]
             # same code for more currency codes
             if len(codes) > 1:
-                self.parser.error("'{}' is ambiguous. Choose one of {}".format(currency, ", ".join(codes)))
+                raise CurrencyError("'{}' is ambiguous. Choose one of {}".format(currency, ", ".join(codes)))
             else:
                 return codes[0]
         else:
-            self.parser.error("Currency '{}' not supported.".format(currency))
+            raise CurrencyError("Currency '{}' not supported.".format(currency))
 
-    def parse_parameters(self):
-        """Parse commandline parameters"""
+    def get_session(self):
+        """Get session of requests; connections to sources are kept alive and reused."""
 
-        self.parser = argparse.ArgumentParser(description='Currency converter')
-        self.parser.add_argument('--amount', type=float, required=True, help='Amount which we want to convert')
-        self.parser.add_argument('--input_currency', type=self.check_currency, required=True,
-                                 help='3 letters name or currency symbol')
-        self.parser.add_argument('--output_currency', type=self.check_currency,
-                                 help='3 letters name or currency symbol')
+        import requests
 
-        self.args = self.parser.parse_args()
-        logger.debug('%s', self.args)
+        with self.session_lock:
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=POOL_SIZE))
+                self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=POOL_SIZE))
+
+        return self.session
 
     def get_json_rates(self):
         """
-        Get rates from 'fixer' source.
-        :return dict of input currency rates for output currency or all available currencies
+        Get rates of all currencies for EUR from 'fixer' source.
+        :return dict of rates
                 None on failure
-        output example: {"base": "CZK", "date": "2017-01-13", "rates": {"AUD": 0.052644, "BGN": 0.072381,...}
+        output example: {"base": "EUR", "date": "2017-01-13", "rates": {"AUD": 1.4038, "BGN": 1.9558,...}
         """
 
-        try:
-            params = {'base': self.args.input_currency}
-
-            if self.args.output_currency:
-                params['symbols'] = self.args.output_currency
+        import requests
 
-            response = requests.get(FIXER_URL, params)
+        try:
+            response = self.get_session().get(FIXER_URL, params={'base': ECB_DEFAULT_BASE}, timeout=self.timeout)
 
             if response.status_code != 200:
                 logger.warning("Failed to obtain currency rates from FIXER: status code %s, reason: %s, text: %s",
                                response.status_code, response.reason, response.text)
             else:
-                return json.loads(response.text)
+                rates = json.loads(response.text)
+
+                if self.valid_rates(rates):
+                    return rates
+
+                logger.warning("Invalid currency rates obtained from FIXER: %s", response.text)
         except requests.exceptions.RequestException as e:
             logger.error("Rates could not be obtained from %s.", FIXER_URL)
 
@@ -113,8 +156,10 @@ class CurrencyConverter:
                  None on failure
         """
 
+        import requests
+
         try:
-            response = requests.get(ECB_URL)
+            response = self.get_session().get(ECB_URL, timeout=self.timeout)
 
             if response.status_code != 200:
                 logger.warning("Failed to obtain currency rates from ECB: status code {}, reason: {}, text: {}".format(
@@ -128,11 +173,13 @@ class CurrencyConverter:
 
     def parse_xml_rates(self, xml_string):
         """
-        Choose rates only for output currency if specified, otherwise use all.
+        Get rates of all currencies from ECB xml.
         @:param xml_string: xml string with rates for EUR
         @:return dictionary of {'base': <currency_code>, 'date': <date>, 'rates': {<currency_code>: <currency_rate>,...}}
         """
 
+        import xml.etree.ElementTree as ET
+
         root = ET.fromstring(xml_string)  # Envelope
         element = root.find('rates:Cube', ECB_NAMESPACES)  # Cube
 
@@ -145,76 +192,359 @@ class CurrencyConverter:
                 if 'time' in subelement.attrib:
                     currencies['time'] = subelement.attrib['time']
                 elif 'rate' in subelement.attrib:
-                    if self.args.output_currency:
-                        if subelement.attrib['currency'] == self.args.output_currency:
-                            currencies['rates'][subelement.attrib['currency']] = float(subelement.attrib['rate'])
-                            break
-                    else:
-                        currencies['rates'][subelement.attrib['currency']] = float(subelement.attrib['rate'])
+                    currencies['rates'][subelement.attrib['currency']] = float(subelement.attrib['rate'])
 
         # Add default base from rates. ECB gave rates always for EUR. So EUR rate is not present in rates.
         currencies['rates'][ECB_DEFAULT_BASE] = float(1)
 
         return currencies
 
-    def convert_rates(self, base, rate):
+    def get_ecb_rates(self):
         """
-        Convert rates from default base to input currency - ECB gave rates only for EUR.
-        :param base: currency for which rates were obtained. It can not be same as input currency
-        :param rate: output currency rate for base currency
-        :return float number of converted rate for input currency
+        Get rates from 'ECB' source.
+        :return dict of rates same as parse_xml_rates
+                None on failure
         """
 
-        if base != self.args.input_currency:
-            return 1 / self.rates['rates'][self.args.input_currency] * rate
-        else:
-            return rate
+        xml_rates = self.get_xml_rates()
+
+        if not xml_rates:
+            return None
+
+        rates = self.parse_xml_rates(xml_rates)
+
+        if self.valid_rates(rates):
+            return rates
+
+        logger.warning("Invalid currency rates obtained from ECB: %s", xml_rates)
+
+        return None
 
-    def convert_amount(self):
+    @staticmethod
+    def valid_rates(rates):
         """
-        Calculates output currency amount
-        @:return True if successfully converted
+        Check rates obtained from source; an error answer is not used nor cached.
+        :return True for dict of base currency and rates of at least one other currency, all positive numbers
         """
 
-        base = self.rates['base']
+        if not isinstance(rates, dict) or not isinstance(rates.get('base'), str) or \
+                not isinstance(rates.get('rates'), dict):
+            return False
 
-        self.conversion["input"] = {"amount": self.args.amount, "currency": self.args.input_currency}
+        return any(currency != rates['base'] for currency in rates['rates']) and \
+            all(isinstance(rate, (int, float)) and not isinstance(rate, bool) and rate > 0
+                for rate in rates['rates'].values())
 
-        # same input and output currencies
-        if self.args.output_currency and self.args.input_currency == self.args.output_currency:
-            self.conversion["output"][self.args.output_currency] = float("{0:.2f}".format(self.args.amount))
-        elif self.rates['rates']:
-            for curr, rate in self.rates['rates'].items():
-                self.conversion["output"][curr] = float(
-                    "{0:.2f}".format(self.convert_rates(base, rate) * self.args.amount, 2))
-        else:
-            logger.error("Currency rates for '{}' were not obtained.", self.args.input_currency)
-            return False  # failure
+    def fetch_rates(self):
+        """
+        Get rates from the first source which gives them. Fixer is asked first, ECB when fixer fails or does not
+        answer in hedge delay.
+        :return tuple of source and its rates - ('fixer', <get_json_rates dict>) or ('ecb', <get_ecb_rates dict>)
+                (None, None) on failure
+        """
+
+        import concurrent.futures
 
-        return True  # success
+        sources = [('fixer', self.get_json_rates), ('ecb', self.get_ecb_rates)]
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(sources))
+        running = {}  # {<future>: <source>}
 
-    def execute(self):
-        self.parse_parameters()
-        self.rates = self.get_json_rates()
+        try:
+            while sources or running:
+                if sources:
+                    source, fetch = sources.pop(0)
+                    running[executor.submit(fetch)] = source
 
-        # in case that fist source is not available, try the second one
-        if not self.rates:
-            xml_rates = self.get_xml_rates()
+                # wait for the next source only for hedge delay
+                done, _ = concurrent.futures.wait(running, timeout=self.hedge_delay if sources else None,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
 
-            if not xml_rates:
-                return None
+                for future in done:
+                    source = running.pop(future)
 
-            self.rates = self.parse_xml_rates(xml_rates)
+                    try:
+                        rates = future.result()
+                    except (ValueError, SyntaxError) as e:  # invalid json, xml.etree.ElementTree.ParseError
+                        logger.warning("Invalid rates obtained from %s: %s", source, e)
+                        continue
 
-        if self.convert_amount():
-            return json.dumps(self.conversion, indent=4, separators=(',', ': '))
-        else:
+                    if rates:
+                        return source, rates
+        finally:
+            # slower source is not waited for, its request ends by timeout
+            executor.shutdown(wait=False)
+
+        return None, None
+
+    def get_cached_rates(self):
+        """
+        Get rates from cache, or from 'fixer' or 'ECB' source when they are not cached.
+        Expired rates are refreshed by fetch_rates, so rates of the source which answers replace them.
+        :return tuple of source and its rates same as fetch_rates
+        """
+
+        entries = {source: self.rates_cache.entry((source, ECB_DEFAULT_BASE)) for source in ('fixer', 'ecb')}
+        # rates of a cache file which are not valid are fetched again
+        cached = [source for source, entry in entries.items() if entry is not None and self.valid_rates(entry["rates"])]
+
+        if not cached:
+            source, rates = self.fetch_rates()
+
+            if rates:
+                self.rates_cache.put(source, ECB_DEFAULT_BASE, rates, self.get_rates_date)
+
+            return source, rates
+
+        # the most recently obtained rates, the other source may have answered the last refresh
+        source = max(cached, key=lambda cached_source: entries[cached_source]["fetched"])
+        rates = self.rates_cache.get(source, ECB_DEFAULT_BASE, lambda: self.refresh_rates(source),
+                                     self.get_rates_date)
+
+        return source, rates
+
+    def refresh_rates(self, cached_source):
+        """
+        Fetch rates to replace expired cached rates of source. Rates of the other source are cached under it.
+        :return rates of cached source
+                None when they could not be fetched or the other source answered
+        """
+
+        source, rates = self.fetch_rates()
+
+        if rates and source != cached_source:
+            self.rates_cache.put(source, ECB_DEFAULT_BASE, rates, self.get_rates_date)
             return None
 
+        return rates
+
+    def get_rates_date(self, rates):
+        """Get date of rates from fixer ('date') or ECB ('time')."""
+
+        return rates.get('date') or rates.get('time')
+
+    def get_rates(self):
+        """
+        Get rates of all currencies. Rates are obtained only for the first conversion, or again when cached
+        rates expire.
+        :return dict of rates same as get_json_rates or parse_xml_rates
+        """
+
+        rates = self.rates
+
+        if rates is not None and (self.rates_cache is None or self.rates_cache.clock() < self.expires):
+            return rates
+
+        with self.lock:
+            if self.rates_cache is not None:
+                source, rates = self.get_cached_rates()
+            elif self.rates is not None:
+                # obtained by another thread
+                return self.rates
+            else:
+                source, rates = self.fetch_rates()
+
+            if not rates:
+                raise RatesError("Currency rates were not obtained.")
+
+            self.rates = rates
+
+            if self.rates_cache is not None:
+                entry = self.rates_cache.entry((source, ECB_DEFAULT_BASE))
+                # expired rates are asked for again until they are refreshed
+                self.expires = entry["expires"] if entry is not None and entry["rates"] is rates else 0
+
+            return self.rates
+
+    def get_rate_matrix(self):
+        """
+        Get cross rates of all currencies for batch conversion.
+        :return batch_converter.RateMatrix
+        """
+
+        import batch_converter
+
+        rates = self.get_rates()
+        rate_matrix = self.rate_matrix
+
+        if rate_matrix is None or rate_matrix.source_rates is not rates:
+            rate_matrix = batch_converter.RateMatrix(rates)
+            rate_matrix.source_rates = rates
+            self.rate_matrix = rate_matrix
+
+        return rate_matrix
+
+    def get_historical_rates(self, date):
+        """
+        Get rates of all currencies published on date or on the nearest previous business day.
+        :return dict of rates same as HistoricalRates.rates_for
+        """
+
+        if self.history is None:
+            raise RatesError("Historical rates are not available.")
+
+        try:
+            rates = self.history.rates_for(date)
+        except ValueError:
+            raise RatesError("Invalid date '{}'.".format(date))
+
+        if rates is None:
+            raise RatesError("Currency rates for {} were not published.".format(date))
+
+        return rates
+
+    def convert(self, amount, input_currency, output_currency=None, date=None):
+        """
+        Convert amount to output currency, or to all currencies if it is not given.
+        :param input_currency: 3 letters name or currency symbol
+        :param output_currency: 3 letters name or currency symbol
+        :param date: convert with historical rates of date (YYYY-MM-DD) instead of current rates
+        :return dict of {"input": {"amount": <float>, "currency": <code>}, "output": {<code>: <float>,...}}
+                with date of used rates in input for historical rates
+        """
+
+        amount = float(amount)
+        input_currency = self.check_currency(input_currency)
+        output_currency = self.check_currency(output_currency) if output_currency else None
+
+        conversion = {"input": {"amount": amount, "currency": input_currency}, "output": {}}
+
+        if date is None:
+            # same input and output currencies
+            if input_currency == output_currency:
+                conversion["output"][output_currency] = round(amount, 2)
+                return conversion
+
+            rates = self.get_rates()
+        else:
+            rates = self.get_historical_rates(date)
+            conversion["input"]["date"] = rates['date']
+
+        # rates of all currencies for base, base itself is not in fixer rates
+        base_rates = rates['rates']
+        input_rate = 1.0 if input_currency == rates['base'] else base_rates.get(input_currency)
+
+        if input_rate is None:
+            raise RatesError("Currency rates for '{}' were not obtained.".format(input_currency))
+
+        if output_currency:
+            output_rate = 1.0 if output_currency == rates['base'] else base_rates.get(output_currency)
+
+            if output_rate is None:
+                raise RatesError("Currency rates for '{}' were not obtained.".format(output_currency))
+
+            conversion["output"][output_currency] = round(output_rate / input_rate * amount, 2)
+        else:
+            conversion["output"] = {code: round(rate / input_rate * amount, 2)
+                                    for code, rate in sorted(dict(base_rates, **{rates['base']: 1.0}).items())}
+
+        return conversion
+
+    def convert_batch(self, batch_file, output, batch_format='csv', date=None):
+        """
+        Convert records of batch file and write them with results to output.
+        @:param batch_file: readable text file of csv or ndjson records
+        @:param date: convert with historical rates of date (YYYY-MM-DD) instead of current rates
+        @:return number of converted records
+        """
+
+        import batch_converter
+
+        read_records = batch_converter.read_csv_records if batch_format == 'csv' else \
+            batch_converter.read_ndjson_records
+        rate_matrix = self.get_rate_matrix() if date is None else \
+            batch_converter.RateMatrix(self.get_historical_rates(date))
+
+        return batch_converter.convert_records(rate_matrix, read_records(batch_file), output, batch_format)
+
+
+def parse_parameters(argv=None):
+    """Parse commandline parameters"""
+
+    import argparse
+
+    def currency_argument(currency):
+        """Check currency of commandline parameter."""
+
+        try:
+            return CurrencyConverter.check_currency(currency)
+        except CurrencyError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    parser = argparse.ArgumentParser(description='Currency converter')
+    parser.add_argument('--amount', type=float, help='Amount which we want to convert')
+    parser.add_argument('--input_currency', type=currency_argument, help='3 letters name or currency symbol')
+    parser.add_argument('--output_currency', type=currency_argument, help='3 letters name or currency symbol')
+    parser.add_argument('--date', help='Convert with historical rates of date (YYYY-MM-DD)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY_DIR,
+                        help='Directory of historical rates store created by historical_rates.py')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Directory of cached rates')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help='Maximal age of cached rates in seconds')
+    parser.add_argument('--no_cache', action='store_true', help='Always obtain current rates')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds to wait for connection to and response of rates source')
+    parser.add_argument('--hedge_delay', type=float, default=DEFAULT_HEDGE_DELAY,
+                        help='Seconds to wait for fixer before asking ECB too, 0 to ask both at once')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='Convert records (amount, from, to) from csv or ndjson file, - for stdin')
+    parser.add_argument('--batch_format', choices=['csv', 'ndjson'],
+                        help='Format of batch file and output, by default given by file extension')
+
+    args = parser.parse_args(argv)
+
+    if args.batch is None:
+        if args.amount is None or args.input_currency is None:
+            parser.error("--amount and --input_currency are required without --batch")
+    elif args.batch_format is None:
+        args.batch_format = 'ndjson' if args.batch.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    logger.debug('%s', args)
+
+    return args
+
+
+def main(argv=None):
+    """Run converter from commandline, return exit code."""
+
+    args = parse_parameters(argv)
+    history = None
+
+    if args.date is not None:
+        from historical_rates import HistoricalRates
+
+        try:
+            history = HistoricalRates.load(args.history)
+        except (OSError, ValueError) as e:
+            logger.error("Historical rates could not be loaded from %s: %s", args.history, e)
+            return 1
+
+    converter = CurrencyConverter(None if args.no_cache else RatesCache(args.cache_dir, args.ttl), args.timeout,
+                                  args.hedge_delay, history)
+
+    try:
+        if args.batch is None:
+            print(json.dumps(converter.convert(args.amount, args.input_currency, args.output_currency, args.date),
+                             indent=4, separators=(',', ': ')))
+            return 0
+
+        try:
+            batch_file = sys.stdin if args.batch == '-' else open(args.batch, 'rt', newline='')
+        except OSError as e:
+            logger.error("Batch file could not be opened: %s", e)
+            return 1
+
+        with batch_file:
+            # converted records are in stdout
+            converted = converter.convert_batch(batch_file, sys.stdout, args.batch_format, args.date)
+            logger.info("Converted %s records.", converted)
+
+        return 0
+    except RatesError as e:
+        logger.error("%s", e)
+        return 1
+
 
 if __name__ == "__main__":
     # Setup logger
-    logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
 
     console_hndl = logging.StreamHandler()
@@ -224,10 +554,4 @@ if __name__ == "__main__":
     console_hndl.setFormatter(formatter)
     logger.addHandler(console_hndl)
 
-    converter = CurrencyConverter()
-    output = converter.execute()
-
-    if output:
-        print(output)
-    else:
-        exit(1)
+    exit(main())
@@ -32,3 +32,31 @@ currencies = {
     "USD": {"symbol": "US$", "symbol_native": "$", "decimal_digits": 2, "rounding": 0.0, "code": "USD"},
     "ZAR": {"symbol": "ZAR", "symbol_native": "R", "decimal_digits": 2, "rounding": 0.0, "code": "ZAR"},
 }
+
+# currency codes of every native symbol, precomputed from currencies (symbol is ambiguous for more codes)
+symbol_codes = {
+    "$": ["AUD", "CAD", "HKD", "MXN", "NZD", "SGD", "USD"],
+    "лв.": ["BGN"],
+    "R$": ["BRL"],
+    "CHF": ["CHF"],
+    "CN¥": ["CNY"],
+    "Kč": ["CZK"],
+    "kr": ["DKK", "NOK", "SEK"],
+    "€": ["EUR"],
+    "£": ["GBP"],
+    "kn": ["HRK"],
+    "Ft": ["HUF"],
+    "Rp": ["IDR"],
+    "₪": ["ILS"],
+    "₹": ["INR"],
+    "¥": ["JPY"],
+    "₩": ["KRW"],
+    "RM": ["MYR"],
+    "₱": ["PHP"],
+    "zł": ["PLN"],
+    "RON": ["RON"],
+    "руб.": ["RUB"],
+    "฿": ["THB"],
+    "TL": ["TRY"],
+    "R": ["ZAR"],
+}
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+"""
+HISTORICAL RATES
+================
+IN: ECB historical rates xml (eurofxref-hist.xml from https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.zip)
+
+FUNCTIONALITY: The xml is parsed as a stream (iterparse), days are kept in numpy blocks, so memory is bounded
+               by the size of the store. Rates are stored as one .npy file per array in store directory
+               and loaded memory-mapped.
+               Rates of a date without rates (weekend, holiday) are rates of the nearest previous business day.
+
+usage: python historical_rates.py eurofxref-hist.xml ~/.cache/currency_converter/history
+"""
+
+ECB_CUBE = '{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}Cube'
+ECB_DEFAULT_BASE = 'EUR'
+BLOCK_DAYS = 1024  # days parsed into one numpy block
+
+
+def to_days(dates):
+    """Get days since epoch of dates (2017-01-13); works for one date or array of dates."""
+
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def parse_days(xml_file):
+    """
+    Generate days of ECB historical xml without loading the whole document.
+    :param xml_file: path or binary file of xml
+    :return generator of (<date>, {<currency_code>: <currency_rate>,...})
+    """
+
+    days_cube = None  # cube with cubes of days, processed days are removed from it
+
+    for event, element in ET.iterparse(xml_file, events=('start', 'end')):
+        if element.tag != ECB_CUBE:
+            continue
+
+        if event == 'start':
+            if not element.attrib:
+                days_cube = element
+        elif 'time' in element.attrib:
+            yield element.attrib['time'], {cube.attrib['currency']: float(cube.attrib['rate']) for cube in element
+                                           if 'rate' in cube.attrib}
+
+            if days_cube is not None:
+                days_cube.clear()
+
+
+class HistoricalRates:
+    # arrays of store saved in directory
+    ARRAYS = ['days', 'currencies', 'rates']
+
+    def __init__(self, days, currencies, rates):
+        """
+        :param days: sorted days since epoch of rates
+        :param currencies: currency codes of rates columns
+        :param rates: rates[day index, currency index] is rate of currency for EUR, nan when not published
+        """
+
+        self.days = days
+        self.currencies = currencies
+        self.rates = rates
+        self.columns = {str(code): column for column, code in enumerate(currencies)}  # {"USD": 0, ...}
+
+    @classmethod
+    def ingest(cls, xml_file):
+        """Create store from ECB historical xml."""
+
+        columns = {ECB_DEFAULT_BASE: 0}  # {<currency_code>: <column>}
+        days = []
+        blocks = []  # filled blocks of rates
+        block = None
+        filled = 0
+
+        for date, day_rates in parse_days(xml_file):
+            for code in day_rates:
+                columns.setdefault(code, len(columns))
+
+            # new block when the current one is full or a new currency appeared
+            if block is None or filled == len(block) or block.shape[1] < len(columns):
+                if block is not None:
+                    blocks.append(block[:filled])
+
+                block = np.full((BLOCK_DAYS, len(columns)), np.nan)
+                filled = 0
+
+            block[filled, 0] = 1.0  # EUR
+
+            for code, rate in day_rates.items():
+                block[filled, columns[code]] = rate
+
+            days.append(date)
+            filled += 1
+
+        if block is not None:
+            blocks.append(block[:filled])
+
+        rates = np.full((len(days), len(columns)), np.nan)
+        row = 0
+
+        for block in blocks:
+            rates[row:row + len(block), :block.shape[1]] = block
+            row += len(block)
+
+        days = to_days(days)
+        order = np.argsort(days, kind='stable')  # ECB lists the newest day first
+
+        return cls(days[order], np.array(list(columns), dtype=str), rates[order])
+
+    def save(self, directory):
+        """Save store to directory, one .npy file per array."""
+
+        os.makedirs(directory, exist_ok=True)
+
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """Load store saved by save; arrays are memory-mapped from their files."""
+
+        return cls(*(np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in cls.ARRAYS))
+
+    def day_index(self, date):
+        """
+        Get index of rates of date or of the nearest previous business day.
+        :return index or None for date before the first rates
+        """
+
+        index = int(np.searchsorted(self.days, to_days(date), 'right')) - 1
+
+        return index if index >= 0 else None
+
+    def rate(self, date, currency, base=ECB_DEFAULT_BASE):
+        """
+        Get rate of currency for base currency on date.
+        :return float rate or None when rates of currencies were not published by the date
+        """
+
+        index = self.day_index(date)
+        column = self.columns.get(currency)
+        base_column = self.columns.get(base)
+
+        if index is None or column is None or base_column is None:
+            return None
+
+        rate = float(self.rates[index, column] / self.rates[index, base_column])
+
+        return None if rate != rate else rate  # nan
+
+    def rates_range(self, dates, currency, base=ECB_DEFAULT_BASE):
+        """
+        Get rates of currency for base currency on many dates at once.
+        :param dates: array of dates (2017-01-13) or of numpy datetime64
+        :return numpy array of rates, nan where rates were not published by the date
+        """
+
+        indexes = np.searchsorted(self.days, to_days(dates), 'right') - 1
+        column = self.columns.get(currency)
+        base_column = self.columns.get(base)
+
+        if column is None or base_column is None:
+            return np.full(indexes.shape, np.nan)
+
+        rates = self.rates[np.maximum(indexes, 0), column] / self.rates[np.maximum(indexes, 0), base_column]
+        rates[indexes < 0] = np.nan
+
+        return rates
+
+    def rates_for(self, date):
+        """
+        Get rates of all currencies published on date or on the nearest previous business day.
+        :return dictionary of {'base': 'EUR', 'date': <date>, 'rates': {<currency_code>: <currency_rate>,...}}
+                None for date before the first rates
+        """
+
+        index = self.day_index(date)
+
+        if index is None:
+            return None
+
+        rates = self.rates[index].tolist()
+
+        return {'base': ECB_DEFAULT_BASE,
+                'date': str(np.datetime64(int(self.days[index]), 'D')),
+                'rates': {code: rates[column] for code, column in self.columns.items()
+                          if rates[column] == rates[column]}}  # not nan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ingest ECB historical rates')
+    parser.add_argument('xml_file', help='ECB historical rates xml (eurofxref-hist.xml)')
+    parser.add_argument('store', help='Directory of historical rates store')
+    args = parser.parse_args()
+
+    try:
+        store = HistoricalRates.ingest(args.xml_file)
+        store.save(args.store)
+    except (OSError, ET.ParseError) as e:
+        sys.exit("Historical rates could not be ingested: {}".format(e))
+
+    print("Ingested {} days of {} currencies.".format(len(store.days), len(store.currencies)))
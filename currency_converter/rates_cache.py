@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+"""
+RATES CACHE
+===========
+Rates obtained from a source (fixer, ECB) for a base currency are kept in memory and in a json file per source and
+base in cache directory. Cached rates expire after ttl seconds or when the source publishes new rates, whichever
+comes first. Expired rates are still returned while they are refreshed in the background, so only the first
+conversion for a source and base waits for the network.
+"""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'currency_converter')
+DEFAULT_TTL = 3600  # seconds
+
+# ECB publishes reference rates on working days around 16:00 CET
+ECB_PUBLICATION_TIME = (15, 0)  # hour, minute UTC
+
+logger = logging.getLogger(__name__)
+
+
+def next_publication(date):
+    """
+    Get time when rates following rates of date are expected to be published.
+    :param date: date of rates - 2017-01-13
+    :return seconds since epoch of the next working day publication
+    """
+
+    day = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+
+    while day.weekday() >= 5:  # saturday, sunday
+        day += timedelta(days=1)
+
+    return day.replace(hour=ECB_PUBLICATION_TIME[0], minute=ECB_PUBLICATION_TIME[1]).timestamp()
+
+
+class RatesCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, clock=time.time):
+        """
+        :param directory: directory of cache files, None to keep rates only in memory
+        :param ttl: maximal age of cached rates in seconds
+        :param clock: function returning current time in seconds since epoch
+        """
+
+        self.directory = directory
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}  # {(source, base): {"fetched": <time>, "expires": <time>, "rates": <fetched rates>}}
+        self.missing = set()  # {(source, base)} without cache file, the file is not read again
+        self.refreshing = {}  # {(source, base): <thread refreshing rates>}
+        self.lock = threading.Lock()
+
+    def get(self, source, base, fetch, date=None):
+        """
+        Get rates of source for base currency from cache; fetch them only when they are not cached.
+        Expired rates are returned and refreshed in the background.
+        :param fetch: function() returning rates (json serializable) or None on failure
+        :param date: function(rates) returning date of rates (2017-01-13) or None
+        :return rates or None when they are not cached and could not be fetched
+        """
+
+        key = (source, base)
+        entry = self.entry(key)
+
+        if entry is None:
+            return self.refresh(key, fetch, date)
+
+        if self.clock() >= entry["expires"]:
+            self.refresh_in_background(key, fetch, date)
+
+        return entry["rates"]
+
+    def cached(self, source, base):
+        """Check if rates of source for base currency are cached (even expired)."""
+
+        return self.entry((source, base)) is not None
+
+    def entry(self, key):
+        """Get cache entry from memory or from file, None if rates are not cached."""
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None and key not in self.missing:
+                entry = self.read(key)
+
+                if entry is not None:
+                    self.entries[key] = entry
+                else:
+                    self.missing.add(key)
+
+        return entry
+
+    def refresh(self, key, fetch, date=None):
+        """Fetch rates and save them to cache. Failed fetch keeps cached rates."""
+
+        rates = fetch()
+
+        if rates is None:
+            return None
+
+        return self.put(*key, rates, date)
+
+    def put(self, source, base, rates, date=None):
+        """
+        Save rates fetched now to cache.
+        :param date: function(rates) returning date of rates (2017-01-13) or None
+        :return rates
+        """
+
+        key = (source, base)
+        fetched = self.clock()
+        expires = fetched + self.ttl
+        rates_date = date(rates) if date else None
+
+        if rates_date:
+            published = next_publication(rates_date)
+
+            # rates may not be published on holidays, the next ones are not expected then
+            if published > fetched:
+                expires = min(expires, published)
+
+        entry = {"fetched": fetched, "expires": expires, "rates": rates}
+
+        with self.lock:
+            self.entries[key] = entry
+            self.missing.discard(key)
+            self.write(key, entry)
+
+        return rates
+
+    def refresh_in_background(self, key, fetch, date=None):
+        """Start refreshing rates in a thread unless they are already being refreshed."""
+
+        with self.lock:
+            if key in self.refreshing:
+                return
+
+            # not a daemon, so rates refreshed by a short-lived process are saved for the next one
+            thread = threading.Thread(target=self.run_refresh, args=(key, fetch, date))
+            self.refreshing[key] = thread
+
+        thread.start()
+
+    def run_refresh(self, key, fetch, date):
+        try:
+            self.refresh(key, fetch, date)
+        except Exception:
+            logger.exception("Refreshing rates of %s for %s failed.", *key)
+        finally:
+            with self.lock:
+                del self.refreshing[key]
+
+    def wait(self):
+        """Wait for all background refreshes."""
+
+        with self.lock:
+            threads = list(self.refreshing.values())
+
+        for thread in threads:
+            thread.join()
+
+    def file_name(self, key):
+        return os.path.join(self.directory, "{}-{}.json".format(*key))
+
+    def read(self, key):
+        """Read cache entry from file, None if it does not exist or is invalid."""
+
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self.file_name(key), 'rt') as f:
+                entry = json.load(f)
+
+            if {"fetched", "expires", "rates"} <= entry.keys():
+                return entry
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        return None
+
+    def write(self, key, entry):
+        """Write cache entry to file; a partially written file is never read."""
+
+        if self.directory is None:
+            return
+
+        file_name = self.file_name(key)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(file_name + '.tmp', 'wt') as f:
+                json.dump(entry, f)
+
+            os.replace(file_name + '.tmp', file_name)
+        except OSError as e:
+            logger.warning("Rates could not be cached to %s: %s", file_name, e)
@@ -0,0 +1,55 @@
+import io
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from currency_converter import CurrencyConverter, RatesError  # noqa: E402
+from historical_rates import HistoricalRates, to_days  # noqa: E402
+from rates_cache import RatesCache  # noqa: E402
+
+"""
+BATCH CONVERTER TESTS
+=====================
+Batches are converted with current rates held by rates cache in memory, or with historical rates of a date.
+
+    python -m pytest currency_converter/tests
+"""
+
+CURRENT_RATES = {"base": "EUR", "date": "2017-01-13", "rates": {"USD": 2.0, "CZK": 27.0}}
+
+
+class BatchConverterTest(unittest.TestCase):
+    def setUp(self):
+        rates_cache = RatesCache(None)
+        rates_cache.put('fixer', 'EUR', CURRENT_RATES)
+
+        history = HistoricalRates(to_days(['2017-01-11', '2017-01-12']), np.array(['USD', 'CZK']),
+                                  np.array([[1.04, 27.1], [1.05, 27.2]]))
+
+        self.converter = CurrencyConverter(rates_cache, history=history)
+
+    def convert(self, date=None):
+        output = io.StringIO()
+        self.converter.convert_batch(io.StringIO("amount,from,to\n1.0,EUR,USD\n"), output, 'csv', date)
+
+        return output.getvalue().splitlines()[1:]
+
+    def test_current_rates(self):
+        self.assertEqual(self.convert(), ['1.0,EUR,USD,2.0'])
+
+    def test_historical_rates(self):
+        self.assertEqual(self.convert('2017-01-12'), ['1.0,EUR,USD,1.05'])
+        # rates of the previous business day for a date without rates
+        self.assertEqual(self.convert('2017-01-15'), ['1.0,EUR,USD,1.05'])
+
+    def test_rates_not_published(self):
+        with self.assertRaises(RatesError):
+            self.convert('2017-01-10')
+
+
+if __name__ == '__main__':
+    unittest.main()
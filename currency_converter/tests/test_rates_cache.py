@@ -0,0 +1,250 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import currency_converter  # noqa: E402
+from rates_cache import RatesCache, next_publication  # noqa: E402
+
+"""
+RATES CACHE TESTS
+=================
+Fixer and ECB are replaced by a local http.server, the cache clock is a fake clock.
+
+    python -m pytest currency_converter/tests
+"""
+
+FRIDAY = '2017-01-13'
+FRIDAY_EVENING = datetime(2017, 1, 13, 18, 0, tzinfo=timezone.utc).timestamp()
+MONDAY_PUBLICATION = datetime(2017, 1, 16, 15, 0, tzinfo=timezone.utc).timestamp()
+
+ECB_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01"
+                 xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+<Cube><Cube time='{}'><Cube currency='USD' rate='{}'/><Cube currency='CZK' rate='27.0'/></Cube></Cube>
+</gesmes:Envelope>"""
+ECB_XML_WITHOUT_RATES = ECB_XML.replace("<Cube currency='USD' rate='{}'/><Cube currency='CZK' rate='27.0'/>", "")
+
+
+class RatesServer:
+    """Fixer and ECB sources answering rates set by tests; requests are counted per source."""
+
+    def __init__(self):
+        self.fixer = {"base": "EUR", "date": FRIDAY, "rates": {"USD": 1.0, "CZK": 27.0}}  # None to fail
+        self.ecb = (FRIDAY, 1.0)  # date and USD rate, None to fail
+        self.requests = {"fixer": 0, "ecb": 0}
+        self.answer = threading.Event()  # cleared to hold answers of fixer
+        self.answer.set()
+
+        rates_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                source = 'ecb' if self.path.startswith('/ecb') else 'fixer'
+                rates_server.requests[source] += 1
+
+                if source == 'fixer':
+                    rates_server.answer.wait()
+                    body = json.dumps(rates_server.fixer) if rates_server.fixer else None
+                else:
+                    body = ECB_XML.format(*rates_server.ecb) if rates_server.ecb else None
+
+                if body is None:
+                    self.send_response(503)
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.end_headers()
+                    self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, source):
+        return 'http://127.0.0.1:{}/{}'.format(self.server.server_port, source)
+
+    def close(self):
+        self.answer.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RatesCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RatesServer()
+        self.addCleanup(self.server.close)
+
+        urls = (currency_converter.FIXER_URL, currency_converter.ECB_URL)
+        self.addCleanup(self.restore_urls, *urls)
+        currency_converter.FIXER_URL = self.server.url('fixer')
+        currency_converter.ECB_URL = self.server.url('ecb')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.now = FRIDAY_EVENING
+
+    @staticmethod
+    def restore_urls(fixer_url, ecb_url):
+        currency_converter.FIXER_URL = fixer_url
+        currency_converter.ECB_URL = ecb_url
+
+    def clock(self):
+        return self.now
+
+    def converter(self, ttl=3600):
+        """Get converter with a new cache of the test directory, like a converter of a new process."""
+
+        rates_cache = RatesCache(self.directory, ttl, self.clock)
+        self.addCleanup(rates_cache.wait)
+
+        return currency_converter.CurrencyConverter(rates_cache, timeout=5, hedge_delay=2)
+
+    def usd(self, converter):
+        return converter.convert(1, 'EUR', 'USD')["output"]["USD"]
+
+    def test_cache_hit_without_network(self):
+        converter = self.converter()
+        self.assertEqual(self.usd(converter), 1.0)
+        self.server.close()
+
+        self.assertEqual([self.usd(converter) for _ in range(10)], [1.0] * 10)
+        self.assertEqual(self.server.requests, {"fixer": 1, "ecb": 0})
+
+    def test_cache_files_are_read_once(self):
+        self.usd(self.converter())
+
+        converter = self.converter()
+        reads = []
+        read = converter.rates_cache.read
+        converter.rates_cache.read = lambda key: reads.append(key) or read(key)
+
+        self.assertEqual([self.usd(converter) for _ in range(100)], [1.0] * 100)
+        self.assertEqual(sorted(reads), [('ecb', 'EUR'), ('fixer', 'EUR')])
+
+    def test_restart_reads_rates_from_disk(self):
+        self.usd(self.converter())
+        self.server.close()
+
+        converter = self.converter()
+        self.assertEqual(self.usd(converter), 1.0)
+        self.assertEqual(converter.rates_cache.entries[('fixer', 'EUR')]["fetched"], FRIDAY_EVENING)
+        self.assertEqual(self.server.requests, {"fixer": 1, "ecb": 0})
+
+    def test_invalid_file_is_fetched_again(self):
+        self.usd(self.converter())
+
+        with open(os.path.join(self.directory, 'fixer-EUR.json'), 'wt') as f:
+            f.write('{"fetched": ')
+
+        self.server.fixer["rates"]["USD"] = 2.0
+        self.assertEqual(self.usd(self.converter()), 2.0)
+        self.assertEqual(self.server.requests["fixer"], 2)
+
+    def test_invalid_rates_are_fetched_again(self):
+        entry = {"fetched": self.now, "expires": self.now + 3600, "rates": ECB_XML.format(FRIDAY, 3.0)}
+
+        with open(os.path.join(self.directory, 'ecb-EUR.json'), 'wt') as f:
+            json.dump(entry, f)
+
+        converter = self.converter()
+        self.assertEqual(self.usd(converter), 1.0)
+        self.assertEqual(converter.get_cached_rates()[0], 'fixer')
+        self.assertEqual(self.server.requests["fixer"], 1)
+
+    def test_ttl_expiry(self):
+        converter = self.converter(ttl=60)
+        self.usd(converter)
+        self.server.fixer["rates"]["USD"] = 2.0
+
+        self.now += 59
+        self.assertEqual(self.usd(converter), 1.0)
+        converter.rates_cache.wait()
+        self.assertEqual(self.server.requests["fixer"], 1)
+
+        self.now += 1
+        self.usd(converter)
+        converter.rates_cache.wait()
+        self.assertEqual(self.server.requests["fixer"], 2)
+        self.assertEqual(self.usd(converter), 2.0)
+
+    def test_publication_expiry(self):
+        converter = self.converter(ttl=7 * 24 * 3600)
+        self.usd(converter)
+        self.assertEqual(next_publication(FRIDAY), MONDAY_PUBLICATION)
+        self.assertEqual(converter.rates_cache.entries[('fixer', 'EUR')]["expires"], MONDAY_PUBLICATION)
+
+        # rates of friday are kept over the weekend
+        self.now = MONDAY_PUBLICATION - 1
+        self.usd(converter)
+        converter.rates_cache.wait()
+        self.assertEqual(self.server.requests["fixer"], 1)
+
+        self.server.fixer = {"base": "EUR", "date": '2017-01-16', "rates": {"USD": 2.0}}
+        self.now = MONDAY_PUBLICATION
+        self.usd(converter)
+        converter.rates_cache.wait()
+        self.assertEqual(self.server.requests["fixer"], 2)
+        self.assertEqual(self.usd(converter), 2.0)
+
+    def test_stale_rates_are_served_while_refreshed(self):
+        converter = self.converter(ttl=60)
+        self.usd(converter)
+        self.server.fixer["rates"]["USD"] = 2.0
+        self.server.answer.clear()
+        self.now += 60
+
+        # fixer does not answer until released, conversions are not held by the refresh
+        self.assertEqual([self.usd(converter) for _ in range(10)], [1.0] * 10)
+        self.assertEqual(len(converter.rates_cache.refreshing), 1)
+
+        self.server.answer.set()
+        converter.rates_cache.wait()
+        self.assertEqual(self.usd(converter), 2.0)
+        self.assertEqual(self.server.requests, {"fixer": 2, "ecb": 0})
+
+    def test_failed_source_is_replaced_on_refresh(self):
+        converter = self.converter(ttl=60)
+        self.usd(converter)
+        self.server.fixer = None
+        self.server.ecb = (FRIDAY, 3.0)
+        self.now += 60
+
+        self.assertEqual(self.usd(converter), 1.0)
+        converter.rates_cache.wait()
+        self.assertEqual(converter.get_cached_rates()[0], 'ecb')
+        self.assertEqual(self.usd(converter), 3.0)
+
+        # rates of ECB are used by the next process too
+        self.assertEqual(self.usd(self.converter(ttl=60)), 3.0)
+
+    def test_error_answer_is_not_cached(self):
+        self.server.fixer = {"success": False, "error": {"code": 101, "type": "missing_access_key"}}
+        self.server.ecb = (FRIDAY, 3.0)
+
+        converter = self.converter()
+        self.assertEqual(self.usd(converter), 3.0)
+        self.assertEqual(converter.get_cached_rates()[0], 'ecb')
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'fixer-EUR.json')))
+
+    def test_ecb_answer_without_rates_is_invalid(self):
+        converter = self.converter()
+        rates = converter.parse_xml_rates(ECB_XML_WITHOUT_RATES.format(FRIDAY))
+
+        self.assertFalse(converter.valid_rates(rates))
+        self.assertTrue(converter.valid_rates(converter.parse_xml_rates(ECB_XML.format(FRIDAY, 1.0))))
+        self.assertFalse(converter.valid_rates({"base": "EUR", "rates": {"USD": "1.0"}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
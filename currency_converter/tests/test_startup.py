@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+"""
+STARTUP TESTS
+=============
+Conversion with cached rates runs in a new process, like currency_converter.py from commandline.
+
+    python -m pytest currency_converter/tests
+"""
+
+CONVERTER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules of fetching rates, batches and history, not needed with cached rates
+HEAVY_MODULES = ('requests', 'numpy', 'xml.etree')
+IMPORT_TIME_LIMIT = 0.15  # seconds of all imports, requests and numpy alone take more
+RUNS = 3  # the fastest run is compared with the limit, a busy machine slows some runs
+
+CONVERSION = """
+import sys
+import currency_converter
+
+code = currency_converter.main(['--amount', '10', '--input_currency', 'USD', '--output_currency', 'CZK',
+                                '--cache_dir', sys.argv[1]])
+print([module for module in {} if module in sys.modules])
+sys.exit(code)
+""".format(HEAVY_MODULES)
+
+
+def import_time(stderr):
+    """Get seconds of all imports from -X importtime output."""
+
+    microseconds = 0
+
+    for line in stderr.splitlines():
+        # import time: <self us> | <cumulative us> | <module>
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            microseconds += int(line.split(':')[1].split('|')[0])
+
+    return microseconds / 10 ** 6
+
+
+class StartupTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        # rates of fixer cached by a previous run, valid for an hour
+        entry = {"fetched": time.time(), "expires": time.time() + 3600,
+                 "rates": {"base": "EUR", "date": "2017-01-13", "rates": {"USD": 1.0, "CZK": 27.0}}}
+
+        with open(os.path.join(self.directory, 'fixer-EUR.json'), 'wt') as f:
+            json.dump(entry, f)
+
+    def convert(self):
+        """Run cached conversion in a new process, return its stdout and seconds of imports."""
+
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', CONVERSION, self.directory],
+                                 cwd=CONVERTER_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True, timeout=60)
+
+        self.assertEqual(process.returncode, 0, process.stderr)
+
+        return process.stdout, import_time(process.stderr)
+
+    def test_cached_conversion_imports(self):
+        seconds = []
+
+        for _ in range(RUNS):
+            stdout, run_seconds = self.convert()
+            seconds.append(run_seconds)
+
+            output = stdout.splitlines()
+            self.assertEqual(output[-1], '[]')
+            self.assertEqual(json.loads("\n".join(output[:-1]))["output"], {"CZK": 270.0})
+
+        self.assertLess(min(seconds), IMPORT_TIME_LIMIT, seconds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+# Fibonacci numbers for list_comprehensions.py.
+#
+#   fib          - n-th number by fast doubling, O(log n) arithmetic operations
+#   cached_fib   - the same with halves remembered in a bounded LRU cache, for repeated calls with close n
+#   fib_sequence - consecutive numbers, O(1) arithmetic operations each, for comprehensions over a range
+#
+# Benchmark of all of them against the naive recursive fib, prints json:
+#   python fibonacci.py --sizes 10 20 25 1000 100000
+
+import argparse
+import json
+import time
+from functools import lru_cache
+from itertools import count
+
+DEFAULT_CACHE_SIZE = 1024
+NAIVE_MAX = 30  # naive fib takes seconds above
+
+
+def naive_fib(n):
+    assert n >= 0
+    if n < 2:
+        return n
+    return naive_fib(n - 1) + naive_fib(n - 2)
+
+
+def fib(n):
+    """ Get n-th fibonacci number by fast doubling: F(2k) = F(k) * (2F(k+1) - F(k)), F(2k+1) = F(k)^2 + F(k+1)^2 """
+    assert n >= 0
+
+    a, b = 0, 1  # F(k), F(k+1) for k of the processed bits of n
+
+    for bit in bin(n)[2:]:
+        a, b = a * (2 * b - a), a * a + b * b  # k = 2k
+
+        if bit == '1':
+            a, b = b, a + b  # k = k + 1
+
+    return a
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def cached_fib(n):
+    """ Get n-th fibonacci number by fast doubling, numbers of halves are cached (cached_fib.cache_info()). """
+    assert n >= 0
+    if n < 3:
+        return (n + 1) // 2
+
+    k = n // 2
+    a, b = cached_fib(k), cached_fib(k + 1)
+
+    return a * a + b * b if n % 2 else a * (2 * b - a)
+
+
+def fib_sequence(start=0, stop=None):
+    """ Generate fibonacci numbers fib(start), fib(start + 1), ... fib(stop - 1), endless without stop. """
+    assert start >= 0
+
+    a, b = fib(start), fib(start + 1)
+
+    for _ in count(start) if stop is None else range(start, stop):
+        yield a
+        a, b = b, a + b
+
+
+def measure(function, *args):
+    """ Get seconds of function call. """
+    start = time.perf_counter()
+    function(*args)
+
+    return time.perf_counter() - start
+
+
+def naive_fib_numbers(n):
+    return [naive_fib(i) for i in range(n)]
+
+
+def fib_numbers(n):
+    return [fib(i) for i in range(n)]
+
+
+def cached_fib_numbers(n):
+    cached_fib.cache_clear()
+    return [cached_fib(i) for i in range(n)]
+
+
+def sequence_numbers(n):
+    return list(fib_sequence(0, n))
+
+
+def cold_cached_fib(n):
+    cached_fib.cache_clear()
+    return cached_fib(n)
+
+
+def benchmark(sizes, naive_max=NAIVE_MAX):
+    """
+    Time computing fibonacci numbers 0..n-1 (the comprehension use case) and the n-th number alone.
+    :param sizes: numbers n
+    :param naive_max: largest n of naive fib, it is exponential
+    :return list of {"n": <n>, "numbers_seconds": {<function>: <seconds>}, "number_seconds": {<function>: <seconds>}}
+    """
+    numbers = {"naive_fib": naive_fib_numbers, "fib": fib_numbers, "cached_fib": cached_fib_numbers,
+               "fib_sequence": sequence_numbers}
+    number = {"naive_fib": naive_fib, "fib": fib, "cached_fib": cold_cached_fib}
+
+    results = []
+
+    for n in sizes:
+        # naive fib is left out above naive_max
+        timed = [name for name in numbers if name != "naive_fib" or n <= naive_max]
+
+        results.append({"n": n,
+                        "numbers_seconds": {name: round(measure(numbers[name], n), 6) for name in timed},
+                        "number_seconds": {name: round(measure(number[name], n), 6) for name in timed
+                                           if name in number}})
+
+    return results
+
+
+def parse_input():
+    parser = argparse.ArgumentParser(description="Benchmark of fibonacci numbers.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10, 20, 25, 1000, 10000],
+                        help="Numbers n of computed fibonacci numbers")
+    parser.add_argument("--naive-max", type=int, default=NAIVE_MAX, help="Largest n of naive recursive fib")
+
+    args = parser.parse_args()
+
+    if min(args.sizes) < 0:
+        parser.error("--sizes must not be negative")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_input()
+
+    print(json.dumps(benchmark(args.sizes, args.naive_max), indent=4, separators=(',', ':')))
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+
+# Benchmark of flight_combinations.RoutesFinder on synthetic flights data.
+#
+#   generate - write seeded random flights csv (SOURCE-DEST-DEP-ARR-FLIGHT_NR-PRICE-BAGS_ALLOWED-BAG_PRICE)
+#              python flight_benchmark.py generate flights.csv --airports 50 --flights-per-day 200 --days 7
+#   run      - time load_csv, route search and serialization for csv files of different sizes, print json
+#              python flight_benchmark.py run --sizes 1000 5000 20000
+
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import islice
+
+from flight_combinations import FlightTable, RoutesFinder
+
+START_DATE = datetime(2017, 2, 11)
+
+
+class FlightsGenerator:
+    """ Seeded generator of random flights; the same parameters and seed give the same csv. """
+
+    def __init__(self, airports=50, flights_per_day=200, days=7, hubs=3, hub_share=0.5, bags_weights=(1, 2, 2),
+                 min_price=10, max_price=500, max_bag_price=30, seed=0):
+        """
+        :param airports: number of airports
+        :param flights_per_day: number of flights departing every day
+        :param days: number of days with flights
+        :param hubs: number of hub airports (the first airports)
+        :param hub_share: part of flights departing from or arriving to a hub
+        :param bags_weights: relative weights of 0, 1, 2, ... allowed bags of flight
+        """
+        if airports < 2:
+            raise ValueError("At least 2 airports are needed.")
+
+        if not 0 <= hub_share <= 1:
+            raise ValueError("Hub share must be between 0 and 1.")
+
+        self.airports = [self.airport_code(i) for i in range(airports)]
+        self.flights_per_day = flights_per_day
+        self.days = days
+        self.hubs = self.airports[:min(max(hubs, 1), airports)]
+        self.hub_share = hub_share
+        self.bags_weights = bags_weights
+        self.min_price = min_price
+        self.max_price = max_price
+        self.max_bag_price = max_bag_price
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def airport_code(index):
+        """ Get 3 letters code of airport index (AAA, AAB, ...). """
+        letters = []
+
+        for _ in range(3):
+            index, letter = divmod(index, 26)
+            letters.append(chr(ord('A') + letter))
+
+        return ''.join(reversed(letters))
+
+    def route(self):
+        """ Get random source and destination airport; hubs are on hub_share of flights. """
+        if self.random.random() < self.hub_share:
+            hub = self.random.choice(self.hubs)
+            other = self.random.choice([airport for airport in self.airports if airport != hub])
+
+            return (hub, other) if self.random.random() < 0.5 else (other, hub)
+
+        return tuple(self.random.sample(self.airports, 2))
+
+    def flights(self):
+        """ Generate flights as dicts with csv columns, ordered by departure. """
+        for day in range(self.days):
+            departures = sorted(self.random.randrange(24 * 60) for _ in range(self.flights_per_day))
+
+            for number, minutes in enumerate(departures):
+                source, destination = self.route()
+                departure = START_DATE + timedelta(days=day, minutes=minutes)
+                arrival = departure + timedelta(minutes=self.random.randrange(45, 6 * 60, 5))
+
+                yield {"source": source,
+                       "destination": destination,
+                       "departure": departure.strftime('%Y-%m-%dT%H:%M:%S'),
+                       "arrival": arrival.strftime('%Y-%m-%dT%H:%M:%S'),
+                       "flight_number": "{}{}".format(self.airport_code(day)[1:], number),
+                       "price": self.random.randint(self.min_price, self.max_price),
+                       "bags_allowed": self.random.choices(range(len(self.bags_weights)), self.bags_weights)[0],
+                       "bag_price": self.random.randint(1, self.max_bag_price)}
+
+    def write_csv(self, csv_file):
+        with open(csv_file, 'wt', newline='') as f:
+            writer = csv.DictWriter(f, FlightTable.COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.flights())
+
+
+class Benchmark:
+    """ Time phases of RoutesFinder (load, search, serialization) on csv files of different sizes. """
+
+    def __init__(self, max_routes=None, workers=1, memoize=False, trace_memory=False):
+        """
+        :param max_routes: stop search after this number of routes (routes grow exponentially with connections)
+        :param trace_memory: measure peak memory of every phase (run again with tracemalloc)
+        """
+        self.max_routes = max_routes
+        self.workers = workers
+        self.memoize = memoize
+        self.trace_memory = trace_memory
+
+    def run_phases(self, csv_file):
+        """ Run all phases and get their {name: (seconds, number of processed items)}. """
+        finder = RoutesFinder()
+        phases = {}
+
+        start = time.perf_counter()
+        finder.flights = finder.load_csv(csv_file)
+        phases["load"] = (time.perf_counter() - start, len(finder.flights))
+
+        start = time.perf_counter()
+        routes = list(islice(finder.search_routes(self.workers, self.memoize), self.max_routes))
+        phases["search"] = (time.perf_counter() - start, len(routes))
+
+        start = time.perf_counter()
+        for route in routes:
+            finder.route_json(route)
+        phases["serialization"] = (time.perf_counter() - start, len(routes))
+
+        return phases
+
+    def measure(self, csv_file):
+        """ Get results of phases for csv file. """
+        results = {name: {"seconds": round(seconds, 6), "items": items,
+                          "items_per_second": round(items / seconds, 1) if seconds else None}
+                   for name, (seconds, items) in self.run_phases(csv_file).items()}
+
+        if self.trace_memory:
+            # memory is measured in a separate run, tracemalloc slows down python code
+            for name, peak in self.memory_peaks(csv_file).items():
+                results[name]["peak_memory_bytes"] = peak
+
+        return results
+
+    def memory_peaks(self, csv_file):
+        """ Get peak traced memory of every phase {name: bytes}. """
+        finder = RoutesFinder()
+        peaks = {}
+
+        tracemalloc.start()
+
+        try:
+            finder.flights = finder.load_csv(csv_file)
+            peaks["load"] = tracemalloc.get_traced_memory()[1]
+
+            tracemalloc.reset_peak()
+            routes = list(islice(finder.search_routes(self.workers, self.memoize), self.max_routes))
+            peaks["search"] = tracemalloc.get_traced_memory()[1]
+
+            tracemalloc.reset_peak()
+            for route in routes:
+                finder.route_json(route)
+            peaks["serialization"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return peaks
+
+    def run(self, sizes, generator_params):
+        """ Generate csv with every number of flights and measure it.
+        :param sizes: numbers of flights per day
+        :param generator_params: other parameters of FlightsGenerator
+        """
+        results = []
+
+        with tempfile.TemporaryDirectory() as directory:
+            for size in sizes:
+                csv_file = os.path.join(directory, "flights_{}.csv".format(size))
+                FlightsGenerator(flights_per_day=size, **generator_params).write_csv(csv_file)
+
+                results.append({"flights_per_day": size, "phases": self.measure(csv_file)})
+
+        return {"generator": generator_params,
+                "max_routes": self.max_routes,
+                "workers": self.workers,
+                "memoize": self.memoize,
+                "results": results,
+                "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def add_generator_arguments(parser):
+    parser.add_argument("--airports", type=int, default=50, help="Number of airports")
+    parser.add_argument("--days", type=int, default=7, help="Number of days with flights")
+    parser.add_argument("--hubs", type=int, default=3, help="Number of hub airports")
+    parser.add_argument("--hub-share", type=float, default=0.5, help="Part of flights from or to a hub")
+    parser.add_argument("--bags-weights", type=float, nargs='+', default=[1, 2, 2],
+                        help="Relative weights of 0, 1, 2, ... allowed bags")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of random generator")
+
+
+def generator_params(args):
+    return {"airports": args.airports, "days": args.days, "hubs": args.hubs, "hub_share": args.hub_share,
+            "bags_weights": args.bags_weights, "seed": args.seed}
+
+
+def parse_input():
+    parser = argparse.ArgumentParser(description="Benchmark of flight combinations.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    generate = commands.add_parser("generate", help="Write random flights csv")
+    generate.add_argument("output_csv", help="Output *.csv file path")
+    generate.add_argument("--flights-per-day", type=int, default=200, help="Number of flights departing every day")
+    add_generator_arguments(generate)
+
+    run = commands.add_parser("run", help="Measure route search on random flights")
+    run.add_argument("--sizes", type=int, nargs='+', default=[50, 100, 200],
+                     help="Numbers of flights per day of measured csv files")
+    run.add_argument("--max-routes", type=int, help="Stop search after this number of routes")
+    run.add_argument("--workers", type=int, default=1, help="Number of processes searching routes in parallel")
+    run.add_argument("--memoize", action="store_true", help="Reuse cached onward routes of flights")
+    run.add_argument("--trace-memory", action="store_true", help="Measure peak memory of every phase")
+    add_generator_arguments(run)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_input()
+
+    try:
+        if args.command == "generate":
+            FlightsGenerator(flights_per_day=args.flights_per_day, **generator_params(args)).write_csv(args.output_csv)
+        else:
+            benchmark = Benchmark(args.max_routes, args.workers, args.memoize, args.trace_memory)
+            print(json.dumps(benchmark.run(args.sizes, generator_params(args)), indent=4, separators=(',', ':')))
+    except (ValueError, OSError) as e:
+        sys.exit(e)
@@ -6,127 +6,660 @@
 #      ignore segments repetition in combination (A-B-A-B)
 
 import argparse
-import copy
+import asyncio
+import cProfile
 import csv
+import hashlib
+import heapq
 import json
+import multiprocessing
+import os
 import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
 from enum import Enum
 
+import numpy as np
+
 MIN_FLIGHT_CHANGE = 1
 MAX_FLIGHT_CHANGE = 4
 
+EPOCH = datetime(1970, 1, 1)  # flight times are stored as seconds since epoch
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'  # flight times in csv and output - 2017-02-11T06:25:00
+TIME_LAYOUT = '0000-00-00T00:00:00'  # TIME_FORMAT checked by parse_times, 0 is any digit
+DATE_FORMAT = '%Y-%m-%d'  # dates of queries - 2017-02-11
+
+CACHE_SUFFIX = '.cache'  # parsed flights of flights.csv are cached in flights.csv.cache directory
+CACHE_VERSION = 1
+
 
 class RoutesFinder(object):
     def __init__(self):
-        self.flights = []
+        self.flights = FlightTable()
         self.routes = []
+        self.dag = None  # RoutesDAG when onward routes of flights are cached
+        self.session_routes = {}  # {(3, 13): count_price((3, 13)), ...} routes kept up to date in a session
+        self.flight_routes = defaultdict(set)  # {3: {(3, 13), ...}, 13: {(3, 13), ...}} session routes of flights
+        self.flights_data = {}  # {3: {"source": "USM", ...}} output data of flights, created once per flight
+        self.flights_json = {}  # {3: '{"source":"USM",...}'} compact json of flights, rendered once per flight
         self.output_data = {"routes": []}
+        self.stats = None  # SearchStats when statistics of run are collected
 
     def execute(self):
         args = self.parse_input()
         # print("Input:", args)
 
+        if args.stats:
+            self.stats = SearchStats()
+
+        if not args.profile:
+            return self.run(args)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        try:
+            return self.run(args)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+    def run(self, args):
+        """ Run the search given by command line arguments and get output data (None if it was already printed). """
+        if args.serve is not None:
+            # answer queries over http with flights loaded only once
+            RoutesServer(args.input_csv, args.cache).run(args.host, args.serve)
+
+            return None
+
         if args.input_csv:
             # load flights from csv
-            self.flights = self.load_csv(args.input_csv)
+            with self.timer('load'):
+                if args.cache:
+                    self.flights = self.load_cached_csv(args.input_csv)
+                else:
+                    self.flights = self.load_csv(args.input_csv)
+
+            query = {name: getattr(args, name) for name in ('source', 'destination', 'date', 'max_segments',
+                                                            'max_price', 'bags')
+                     if getattr(args, name) is not None}
+
+            if args.count:
+                # number of routes only, all routes are not created
+                with self.timer('search'):
+                    if query:
+                        return {"routes_count": sum(1 for _ in self.query_paths(**query))}
+
+                    return {"routes_count": self.count_routes()}
+
+            if args.top_k is not None:
+                # k cheapest routes for every number of bags
+                with self.timer('search'):
+                    top_routes = self.top_routes(args.top_k, **query)
+
+                with self.timer('serialization'):
+                    return {"top_routes": {"tickets + {} bag/s".format(pieces): [self.route_data(route)
+                                                                                 for route in routes]
+                                           for pieces, routes in top_routes.items()}}
+
+            if query:
+                routes = self.query(**query)
+            else:
+                routes = self.search_routes(args.workers, args.memoize)
+
+            if args.stream:
+                if self.stats is not None:
+                    routes = self.stats.timed(routes, 'search')
+
+                # print every route as one json line (NDJSON) as soon as it is found
+                try:
+                    for route in routes:
+                        with self.timer('serialization'):
+                            sys.stdout.write(self.route_json(route) + '\n')
+                            sys.stdout.flush()
+                except BrokenPipeError:
+                    # consumer of the output stopped reading (| head), the rest of routes is not needed;
+                    # stdout is redirected to devnull, so flushing it at exit doesn't fail again
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+                return None
+
+            with self.timer('search'):
+                self.routes = list(routes)
 
-            # create routes from connecting flights; find connecting flights for each row-flight
-            for from_index, from_flight in enumerate(self.flights):
-                route = [from_index]
-                self.find_routes(from_index, route)
+            if self.stats is not None:
+                self.stats.peak_routes = max(self.stats.peak_routes, len(self.routes))
 
             # create output data {"routes": [{"3->13": {"prices":[], "flights": []}]}
-            for route_index, route in enumerate(self.routes):
+            with self.timer('serialization'):
+                for route in self.routes:
+                    self.output_data["routes"].append(self.route_data(route))
+
+            return self.output_data
+
+    def timer(self, phase):
+        """ Context manager adding time of block to phase in stats (doing nothing without stats). """
+        if self.stats is None:
+            return nullcontext()
+
+        return self.stats.timer(phase)
+
+    def search_routes(self, workers=1, memoize=False):
+        """ Generate routes from connecting flights; find connecting flights for each row-flight.
+        :param workers: number of processes searching routes from different starting flights
+        :param memoize: reuse cached onward routes of flights (RoutesDAG)
+        """
+        if workers > 1:
+            # flights are sent to every worker only once, routes come back in the order of starting flights
+            with multiprocessing.Pool(workers, initializer=init_worker,
+                                      initargs=(self.flights, memoize)) as pool:
+                chunksize = max(1, len(self.flights) // (workers * 4))
+
+                for routes in pool.imap(find_worker_routes, self.flights.indexes().tolist(), chunksize):
+                    yield from routes
+        else:
+            if memoize:
+                self.dag = self.routes_dag()
+
+            for from_index in self.flights.indexes().tolist():
+                yield from self.find_start_routes(from_index)
+
+    def routes_dag(self):
+        """ Get RoutesDAG of flights, None if connections of flights make a cycle (routes are searched without it). """
+        try:
+            return RoutesDAG(self.flights)
+        except ValueError:
+            return None
+
+    def count_routes(self):
+        """ Get number of all routes; they are not created unless connections of flights make a cycle. """
+        dag = self.routes_dag()
+
+        if dag is None:
+            return sum(1 for _ in self.search_routes())
+
+        return dag.count_routes()
+
+    def find_start_routes(self, from_index):
+        """ Generate all routes starting with from_index flight. """
+        if self.dag:
+            yield from self.dag.routes(from_index)
+            return
+
+        yield from self.find_routes(RoutePath(self.flights, from_index))
+
+    def query(self, **query):
+        """ Generate routes (lists of flight indexes) matching the query, see query_paths. """
+        for path in self.query_paths(**query):
+            yield Route(path.route, path.prices())
+
+    def query_paths(self, source=None, destination=None, date=None, max_segments=None, max_price=None, bags=0,
+                    prune=None):
+        """ Generate paths of routes matching the query in search order. Search is pruned by the query while running.
+        :param source: airport code of the first flight departure
+        :param destination: airport code of the last flight arrival
+        :param date: date of the first flight departure - 2017-02-11
+        :param max_segments: maximal number of flights in route
+        :param max_price: maximal price of tickets and bags (prices are expected to be non-negative)
+        :param bags: number of bags which must be allowed in whole route
+        :param prune: function(path) returning True if the route and all its onward routes should be skipped
+        """
+        start, end = None, None
+
+        if date is not None:
+            start = int((datetime.strptime(date, DATE_FORMAT) - EPOCH).total_seconds())
+            end = start + 24 * 3600
+
+        start_flights = self.flights.departures(source, start, end).tolist() if source is not None else \
+            [from_index for from_index in self.flights.indexes().tolist()
+             if start is None or start <= self.flights.departure[from_index] < end]
+
+        # {flight index: minimal number of flights from it (including it) to destination}
+        segments = self.segments_to(destination) if destination is not None else None
+        destination_id = self.flights.airport_id(destination) if destination is not None else None
+
+        def skip(path):
+            to_index = path.route[-1]
+
+            if max_segments is not None and len(path.route) > max_segments:
+                return True
+
+            # destination can't be reached from the last flight (in remaining number of flights)
+            if segments is not None and (to_index not in segments or max_segments is not None and
+                                         len(path.route) - 1 + segments[to_index] > max_segments):
+                return True
+
+            if max_price is not None and path.tickets_price + path.baggage_price * bags > max_price:
+                return True
+
+            return prune is not None and prune(path)
+
+        def accept(path):
+            return destination_id is None or self.flights.destination[path.route[-1]] == destination_id
+
+        for from_index in start_flights:
+            # bags allowed can only grow on route, so it is enough to check them for the first flight
+            if self.flights.bags_allowed[from_index] < bags:
+                continue
+
+            path = RoutePath(self.flights, from_index)
+
+            if not skip(path):
+                yield from self.walk_routes(path, skip, accept)
+
+    def top_routes(self, k, **query):
+        """ Get k cheapest routes for every number of bags. Keeps only k routes per number of bags
+        and skips searching routes which can't be cheaper.
+        :param query: parameters of query
+        :return {bags: [route, ...]} routes ordered by price (routes with same price in search order)
+        """
+        heaps = defaultdict(list)  # {bags: [(-price, -order, route), ...]} max heaps of k cheapest routes
+
+        def prune(path):
+            # prices only grow on onward routes and those routes are found later, so they lose on same price
+            for pieces in range(path.allowed_baggage + 1):
+                heap = heaps[pieces]
+
+                if len(heap) < k or path.tickets_price + path.baggage_price * pieces < -heap[0][0]:
+                    return False
+
+            return True
+
+        for order, path in enumerate(self.query_paths(prune=prune, **query)):
+            prices = path.prices()
+            route = Route(path.route, prices)
+
+            for pieces in range(prices['allowed_baggage'] + 1):
+                price = prices["tickets_price"] + prices["baggage_price"] * pieces
+                heap = heaps[pieces]
+
+                if len(heap) < k:
+                    heapq.heappush(heap, (-price, -order, route))
+                elif price < -heap[0][0]:
+                    heapq.heapreplace(heap, (-price, -order, route))
+
+        if self.stats is not None:
+            self.stats.peak_routes = max(self.stats.peak_routes, sum(map(len, heaps.values())))
+
+        return {pieces: [route for _, _, route in sorted(heaps[pieces], reverse=True)]
+                for pieces in sorted(heaps) if heaps[pieces]}
+
+    def segments_to(self, destination):
+        """ Get minimal number of flights (including the first one) from flights to destination airport.
+        :return {flight index: number of flights}, only for flights from which destination can be reached
+        """
+        segments = {flight_index: 1 for flight_index in self.flights.arrivals(destination).tolist()}
+        flights_to_check = list(segments)
+
+        # breadth first search back through previous connections
+        for flight_index in flights_to_check:
+            for previous_flight in self.flights.previous_connections(flight_index).tolist():
+                if previous_flight not in segments:
+                    segments[previous_flight] = segments[flight_index] + 1
+                    flights_to_check.append(previous_flight)
+
+        return segments
+
+    def open_session(self, csv_file):
+        """ Load flights and find all routes; they are kept up to date by add_flights, remove_flights
+        and update_price then.
+        """
+        self.flights = self.load_csv(csv_file)
+        self.dag = None
+        self.flights_data = {}
+        self.flights_json = {}
+        self.session_routes = {}
+        self.flight_routes = defaultdict(set)
+
+        self.save_session_routes(self.search_routes())
+
+    def save_session_routes(self, routes):
+        """ Add routes with their prices to session. """
+        for route in routes:
+            route = tuple(route)
+            self.session_routes[route] = self.count_price(route)
+
+            for flight_index in route:
+                self.flight_routes[flight_index].add(route)
+
+        if self.stats is not None:
+            self.stats.peak_routes = max(self.stats.peak_routes, len(self.session_routes))
+
+    def get_session_routes(self):
+        """ Get all routes of session in the search order (routes are ordered as tuples of flight indexes). """
+        return [list(route) for route in sorted(self.session_routes)]
+
+    def add_flights(self, rows):
+        """ Add new flights to session and find routes with them.
+        :param rows: list of flights as dicts with the same keys as csv columns
+        :return delta of session routes {"added": [[3, 13], ...], "removed": [], "changed": []}
+        """
+        first_new = len(self.flights)
+        self.flights.extend(FlightTable(**{column: [row[column] for row in rows] for column in FlightTable.COLUMNS}))
+        new_flights = range(first_new, len(self.flights))
+
+        # routes with new flights can start only with them or with flights from which they can be reached
+        start_flights = set(new_flights)
+        previous_flights = list(new_flights)
+
+        while previous_flights:
+            for previous_flight in self.flights.previous_connections(previous_flights.pop()).tolist():
+                if previous_flight not in start_flights:
+                    start_flights.add(previous_flight)
+                    previous_flights.append(previous_flight)
+
+        # new flights have the highest indexes
+        added = [route for from_index in sorted(start_flights) for route in self.find_start_routes(from_index)
+                 if max(route) >= first_new]
+        self.save_session_routes(added)
+
+        return {"added": added, "removed": [], "changed": []}
+
+    def remove_flights(self, indexes):
+        """ Cancel flights in session and remove their routes.
+        :param indexes: indexes of cancelled flights
+        :return delta of session routes {"added": [], "removed": [[3, 13], ...], "changed": []}
+        """
+        self.flights.cancel(indexes)
+
+        removed = set()
+
+        for flight_index in indexes:
+            removed.update(self.flight_routes.pop(flight_index, ()))
+
+        for route in removed:
+            del self.session_routes[route]
+
+            for flight_index in route:
+                self.flight_routes[flight_index].discard(route)
+
+        return {"added": [], "removed": [list(route) for route in sorted(removed)], "changed": []}
+
+    def update_price(self, index, price=None, bag_price=None):
+        """ Change ticket and/or baggage price of flight in session and update prices of its routes.
+        :return delta of session routes {"added": [], "removed": [], "changed": [[3, 13], ...]}
+        """
+        if price is not None:
+            self.flights.price[index] = price
+
+        if bag_price is not None:
+            self.flights.bag_price[index] = bag_price
+
+        # output data of flight is created again with new prices
+        self.flights_data.pop(index, None)
+        self.flights_json.pop(index, None)
+
+        changed = sorted(self.flight_routes[index])
+
+        for route in changed:
+            self.session_routes[route] = self.count_price(route)
+
+        return {"added": [], "removed": [], "changed": [list(route) for route in changed]}
+
+    def route_data(self, route):
+        """ Create output data for route {"3->13": {"prices":[], "flights": []}}
+        Flights data are shared by all routes with the flight, don't change them.
+        """
+        route_key = '->'.join(map(str, route))
+
+        return {route_key: {"flights": [self.flight_data(flight_index) for flight_index in route],
+                            "prices": self.route_prices(route)}}
+
+    def route_json(self, route):
+        """ Get compact json of route data (same as json.dumps(route_data(route), separators=(',', ':'))),
+        assembled from json of flights rendered once per flight.
+        """
+        return '{"%s":{"flights":[%s],"prices":%s}}' % ('->'.join(map(str, route)),
+                                                        ','.join(map(self.flight_json, route)),
+                                                        json.dumps(self.route_prices(route), separators=(',', ':')))
+
+    def route_prices(self, route):
+        """ Get final prices for 0,1,2,.. pcs of baggage [{"tickets + 0 bag/s": 24.0}, ...] """
+        # prices of routes found by search were counted while the route was searched
+        prices = getattr(route, 'prices', None)
+
+        if prices is None:
+            with self.timer('pricing'):
                 prices = self.count_price(route)
-                self.output_data["routes"].append({'->'.join(str(i) for i in route): {"flights": [], "prices": []}})
-                # print("\nROUTE:", route)
-
-                if isinstance(route, list):
-                    for flight_index in route:
-                        flight = self.flights[flight_index]
-                        self.save_flights(route_index, flight)
-                        # print(" ", self.flights[flightIndex])
-                else:
-                    flight = self.flights[route]
-                    self.save_flights(flight)
-                    # print(" ", self.flights[route])
 
-                # get final prices for 0,1,2,.. pcs of baggage
-                for pieces in range(prices['allowed_baggage'] + 1):
-                    self.output_data["routes"][route_index]['->'.join(str(i) for i in route)]["prices"].append(
-                        {"tickets + {} bag/s".format(pieces): prices["tickets_price"] + prices["baggage_price"] * pieces})
+        return [{"tickets + {} bag/s".format(pieces): prices["tickets_price"] + prices["baggage_price"] * pieces}
+                for pieces in range(prices['allowed_baggage'] + 1)]
 
-            return self.output_data
+    def flight_data(self, flight_index):
+        """ Get output data of flight, created only once for every flight. """
+        data = self.flights_data.get(flight_index)
+
+        if data is None:
+            data = self.flights_data[flight_index] = self.check_date(self.flights[flight_index].as_dict())
+
+        return data
+
+    def flight_json(self, flight_index):
+        """ Get compact json of flight output data, rendered only once for every flight. """
+        data = self.flights_json.get(flight_index)
+
+        if data is None:
+            data = self.flights_json[flight_index] = json.dumps(self.flight_data(flight_index),
+                                                                separators=(',', ':'))
+
+        return data
 
     def parse_input(self):
         parser = argparse.ArgumentParser(description="Process flight information.")
         parser.add_argument("input_csv", default=sys.stdin, help="Input *.csv file path")
+        parser.add_argument("--stream", action="store_true",
+                            help="Print routes as NDJSON (one json per line) as soon as they are found")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes searching routes in parallel")
+        parser.add_argument("--memoize", action="store_true",
+                            help="Reuse cached onward routes of flights (faster, uses more memory)")
+        parser.add_argument("--count", action="store_true",
+                            help="Print only the number of routes")
+        parser.add_argument("--from", dest="source", help="Airport code of route departure")
+        parser.add_argument("--to", dest="destination", help="Airport code of route arrival")
+        parser.add_argument("--date", help="Date of route departure - YYYY-MM-DD")
+        parser.add_argument("--max-segments", type=int, help="Maximal number of flights in route")
+        parser.add_argument("--max-price", type=float, help="Maximal price of route including bags")
+        parser.add_argument("--bags", type=int, help="Number of bags allowed in route")
+        parser.add_argument("--top-k", type=int, help="Print only k cheapest routes for every number of bags")
+        parser.add_argument("--cache", action="store_true",
+                            help="Cache parsed flights next to the csv file and load them from there next time")
+        parser.add_argument("--stats", action="store_true",
+                            help="Print statistics of search (time of phases, examined flights, ...) to stderr")
+        parser.add_argument("--profile", metavar="FILE", help="Save cProfile statistics of run to file")
+        parser.add_argument("--serve", type=int, metavar="PORT",
+                            help="Answer route queries over http on port, reload flights when the csv file changes")
+        parser.add_argument("--host", default="127.0.0.1", help="Host of --serve http server")
 
-        return parser.parse_args()
+        args = parser.parse_args()
 
-    def load_csv(self, csv_file):
-        flights = []
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+
+        if args.top_k is not None and args.top_k < 1:
+            parser.error("--top-k must be at least 1")
+
+        if args.count and args.top_k is not None:
+            parser.error("--count can not be combined with --top-k")
 
+        if args.date is not None:
+            try:
+                parse_date(args.date)
+            except ValueError:
+                parser.error("--date must be a date in format YYYY-MM-DD")
+
+        return args
+
+    def load_csv(self, csv_file):
         try:
             with open(csv_file, 'rt') as csvfile:
+                reader = csv.reader(csvfile)
+
                 try:
-                    reader = csv.DictReader(csvfile) # closed file
+                    # flights = [Flight(**row) for row in csv.DictReader(csvfile)]
+
+                    # blank lines are skipped as by csv.DictReader
+                    header = next((row for row in reader if row), FlightTable.COLUMNS)
+                    rows = []
 
-                    # for row in reader:
-                    #     try:
-                    #         flight = Flight(row['source'], row['destination'], row['departure'], row['arrival'],
-                    #                         row['flight_number'], row['price'], row['bags_allowed'], row['bag_price'])
-                    #         flights.append(flight)
-                    #
-                    #     except ValueError:
-                    #         pass
+                    for row in reader:
+                        if not row:
+                            continue
 
-                    # flights = [Flight(row['source'], row['destination'], row['departure'], row['arrival'],
-                    #                   row['flight_number'], row['price'], row['bags_allowed'], row['bag_price'])
-                    #            for row in reader]
+                        # zip of columns would silently cut all of them to the shortest row
+                        if len(row) != len(header):
+                            raise csv.Error("expected {} fields, saw {}".format(len(header), len(row)))
 
-                    flights = [Flight(**row) for row in reader]
+                        rows.append(row)
 
-                    return flights
+                    columns = dict(zip(header, zip(*rows)))  # {"source": ("USM", ...), ...}
+
+                    return FlightTable(**columns)
                 except csv.Error as e:
-                    sys.exit('file {}, line {}: {}'.format(csv_file, flights.line_num, e))
+                    sys.exit('file {}, line {}: {}'.format(csv_file, reader.line_num, e))
+                except ValueError as e:
+                    # columns are converted at once, the row of invalid value is not known
+                    sys.exit('file {}: {}'.format(csv_file, e))
         except OSError as e:
             sys.exit('Cannot open file {}. {}'.format(csv_file, e))
 
-    def find_routes(self, from_index, route):
-        from_flight = self.flights[from_index]   # 0
+    def load_cached_csv(self, csv_file):
+        """ Load flights from cache directory of csv file if the file was not changed (same size and modification time
+        or content hash), otherwise load them from csv and save them to cache.
+        """
+        cache_dir = csv_file + CACHE_SUFFIX
+        key_file = os.path.join(cache_dir, 'key.json')
 
-        # find all connecting flights (their index) to from_flight
-        connecting_flights = [to_index for to_index, to_flight in enumerate(self.flights)
-                              if from_flight.destination == to_flight.source
-                              and from_flight.change_possible(to_flight.departure)
-                              and from_flight.bags_allowed <= to_flight.bags_allowed]
+        try:
+            stat = os.stat(csv_file)
+        except OSError as e:
+            sys.exit('Cannot open file {}. {}'.format(csv_file, e))
 
-        if connecting_flights:  # [5,8]
-            # append connecting flight to route [5,8] -> [0,5], [0,8]
-            for connecting_flight in connecting_flights:
-                new_route = copy.copy(route)
-                new_route.append(connecting_flight)
+        key = {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
 
-                if new_route not in self.routes and not self.visited(route, connecting_flight):
-                    self.routes.append(new_route)
-                    self.find_routes(connecting_flight, new_route)
+        try:
+            with open(key_file, 'rt') as f:
+                cached_key = json.load(f)
+        except (OSError, ValueError):
+            cached_key = {}
 
-    def visited(self, route=[], connection=None):
-        """ Ignore segments (visited airports) repetition in combination (A->B->A->B). """
+        if all(cached_key.get(name) == value for name, value in key.items()):
+            try:
+                return FlightTable.load(cache_dir)
+            except (OSError, ValueError):
+                pass
 
-        visited_airports = [self.flights[flight].source for flight in route]
+        key["hash"] = self.file_hash(csv_file)
 
-        if self.flights[connection].source in visited_airports:
-            # find index of connection source in visited airports on route
-            segment_start = visited_airports.index(self.flights[connection].source)
+        if cached_key.get("version") == CACHE_VERSION and cached_key.get("hash") == key["hash"]:
+            # only modification time changed (file touched or copied)
+            try:
+                flights = FlightTable.load(cache_dir)
+                self.save_cache_key(key_file, key)
 
-            # check if destination is the same as next visited airport after found index
-            if self.flights[connection].destination == visited_airports[segment_start + 1]:
-                return True
+                return flights
+            except (OSError, ValueError):
+                pass
 
-        return False
+        flights = self.load_csv(csv_file)
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+
+            # cache is invalid until the new key is saved
+            if os.path.exists(key_file):
+                os.remove(key_file)
+
+            flights.save(cache_dir)
+            self.save_cache_key(key_file, key)
+        except OSError as e:
+            sys.stderr.write('Cannot save flights cache {}. {}\n'.format(cache_dir, e))
+
+        return flights
+
+    def file_hash(self, file_name):
+        """ Get hash of file content. """
+        file_hash = hashlib.blake2b()
+
+        with open(file_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
+    def save_cache_key(self, key_file, key):
+        with open(key_file + '.tmp', 'wt') as f:
+            json.dump(key, f)
+
+        os.replace(key_file + '.tmp', key_file)
+
+    def find_routes(self, path):
+        """ Generate all routes continuing path with connecting flights. """
+        for path in self.walk_routes(path):
+            yield Route(path.route, path.prices())
+
+    def walk_routes(self, path, skip=None, accept=None):
+        """ Depth first search of routes continuing path with connecting flights (in csv order).
+        Generated path is changed by the search, so copy whatever is needed from it before continuing.
+        :param skip: function(path) returning True if the route and all its onward routes should be skipped
+        :param accept: function(path) returning True if the route should be generated
+        """
+        stats = self.stats
+
+        def connecting(index):
+            """ Get iterator of flights connecting to flight on index. """
+            flights = self.flights.connections(index).tolist()
+
+            if stats is not None:
+                stats.candidates += len(flights)
+                stats.max_depth = max(stats.max_depth, len(path.route))
+
+            return iter(flights)
+
+        # iterators of not yet searched connecting flights for every flight added to path
+        connections = [connecting(path.route[-1])]
+
+        while connections:
+            to_index = next(connections[-1], None)
+
+            if to_index is None:
+                # all connections of the last flight were searched
+                connections.pop()
+
+                if connections:
+                    path.pop()
+
+                continue
+
+            if path.visited(to_index):
+                if stats is not None:
+                    stats.visited_rejected += 1
+
+                continue
+
+            path.push(to_index)
+
+            if skip is not None and skip(path):
+                if stats is not None:
+                    stats.skipped += 1
+
+                path.pop()
+                continue
+
+            if stats is not None:
+                stats.connections += 1
+
+            if accept is None or accept(path):
+                if stats is not None:
+                    stats.routes += 1
+
+                yield path
+
+            connections.append(connecting(to_index))
 
     def count_price(self, route=[]):
         """ Get price for all tickets and baggage in a route. """
@@ -141,43 +674,739 @@ class RoutesFinder(object):
 
         return {'tickets_price': tickets_price, 'baggage_price': baggage_price, 'allowed_baggage': allowed_baggage}
 
-    def save_flights(self, route_index, flight):
-        # self.output_data["routes"][route_index]['->'.join(str(i) for i in self.routes[route_index])]["flights"].append(
-        #     {"flight_number": flight.flight_number,
-        #      "source": flight.source,
-        #      "departure": flight.departure.strftime('%Y-%m-%dT%H:%M:%S'),
-        #      "destination": flight.destination,
-        #      "arrival": flight.arrival.strftime('%Y-%m-%dT%H:%M:%S'),
-        #      "price": flight.price,
-        #      "bag_price": flight.bag_price,
-        #      "bags_allowed": flight.bags_allowed
-        #     })
-
-        self.output_data["routes"][route_index]['->'.join(str(i) for i in self.routes[route_index])]["flights"].append(
-            self.check_date(flight.__dict__))
-
     def check_date(self, flight):
-        """ Change date to string """
-        for key, value in flight.items():
-            if isinstance(value, datetime):
-                flight[key] = value.strftime('%Y-%m-%dT%H:%M:%S')
+        """ Get copy of flight data with dates changed to string. """
+        return {key: value.strftime(TIME_FORMAT) if isinstance(value, datetime) else value
+                for key, value in flight.items()}
+
+
+class SearchStats:
+    """ Statistics of RoutesFinder run, collected only when RoutesFinder.stats is set.
+    Flights examined in worker processes or by RoutesDAG are not counted.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)  # {phase: seconds} - load, search, pricing, serialization
+        self.candidates = 0        # connecting flights examined by search
+        self.connections = 0       # connections accepted (added to routes being searched)
+        self.visited_rejected = 0  # connections rejected by segments repetition (A->B->A->B)
+        self.skipped = 0           # connections skipped by query (and all routes continuing them)
+        self.routes = 0            # routes found
+        self.max_depth = 0         # maximal number of flights of searched route
+        self.peak_routes = 0       # maximal number of routes kept at once
+        self.running = []          # time of timers nested in running timers
+
+    @contextmanager
+    def timer(self, phase):
+        """ Add time of block to phase; time of nested timers is added only to their own phases. """
+        self.running.append(0.0)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.seconds[phase] += seconds - self.running.pop()
+
+            if self.running:
+                self.running[-1] += seconds
+
+    def timed(self, iterable, phase):
+        """ Generate items of iterable; time of getting them is added to phase. """
+        iterator = iter(iterable)
+
+        while True:
+            with self.timer(phase):
+                item = next(iterator, StopIteration)
+
+            if item is StopIteration:
+                return
+
+            yield item
+
+    def as_dict(self):
+        return {"seconds": {phase: round(seconds, 6) for phase, seconds in self.seconds.items()},
+                "candidates": self.candidates,
+                "connections": self.connections,
+                "visited_rejected": self.visited_rejected,
+                "skipped": self.skipped,
+                "routes": self.routes,
+                "max_depth": self.max_depth,
+                "peak_routes": self.peak_routes}
+
+
+# route finder of a worker process, see RoutesFinder.search_routes
+worker_finder = None
+
+
+def init_worker(flights, memoize=False):
+    """ Set up worker process with flights loaded by the main process. """
+    global worker_finder
+
+    worker_finder = RoutesFinder()
+    worker_finder.flights = flights
+
+    if memoize:
+        worker_finder.dag = worker_finder.routes_dag()
+
+
+def find_worker_routes(from_index):
+    """ Find all routes starting with from_index flight in a worker process. """
+    return list(worker_finder.find_start_routes(from_index))
+
+
+def parse_date(date):
+    """ Get date of query (2017-02-11) checked by DATE_FORMAT, ValueError for other format. """
+    datetime.strptime(date, DATE_FORMAT)
+
+    return date
+
 
-        return flight
+class RoutesServer:
+    """ Asyncio http server answering route queries from flights loaded only once.
+    The csv file is checked for changes and loaded again in the background, running queries keep the old flights.
+
+    GET /routes?from=BTW&to=REJ&date=2017-02-11&max_segments=3&max_price=300&bags=1&top_k=5
+    GET /count
+    """
+
+    # {url parameter: (RoutesFinder.query_paths parameter, type)}
+    QUERY_PARAMS = {'from': ('source', str), 'to': ('destination', str), 'date': ('date', parse_date),
+                    'max_segments': ('max_segments', int), 'max_price': ('max_price', float), 'bags': ('bags', int),
+                    'top_k': ('top_k', int)}
+
+    STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+    def __init__(self, csv_file, cache=False, reload_interval=1.0):
+        self.csv_file = csv_file
+        self.cache = cache
+        self.reload_interval = reload_interval  # seconds between checks of csv file changes
+        self.finder = None
+        self.csv_stat = None  # (size, modification time) of loaded csv file
+        self.routes_count = None  # (finder, number of its routes), routes are counted once per loaded flights
+        self.count_lock = threading.Lock()
+
+    def run(self, host, port):
+        self.load()
+        asyncio.run(self.serve(host, port))
+
+    def load(self):
+        """ Load flights to a new RoutesFinder, which replaces the current one when loaded. """
+        try:
+            stat = os.stat(self.csv_file)
+        except OSError as e:
+            sys.exit('Cannot open file {}. {}'.format(self.csv_file, e))
+
+        # file is not loaded again until it changes, even if it can't be loaded now
+        self.csv_stat = (stat.st_size, stat.st_mtime_ns)
+
+        finder = RoutesFinder()
+        finder.flights = finder.load_cached_csv(self.csv_file) if self.cache else finder.load_csv(self.csv_file)
+
+        self.finder = finder
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.ensure_future(self.watch())
+
+        sys.stderr.write('Serving routes of {} on http://{}:{}/\n'.format(self.csv_file, host, port))
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+    async def watch(self):
+        """ Load flights again when csv file changes. """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(self.reload_interval)
+
+            try:
+                stat = os.stat(self.csv_file)
+
+                if (stat.st_size, stat.st_mtime_ns) != self.csv_stat:
+                    await loop.run_in_executor(None, self.load)
+            except (Exception, SystemExit) as e:
+                # any error of one version of the file must not stop reloading of the next one
+                sys.stderr.write('Cannot reload file {}. {!r}\n'.format(self.csv_file, e))
+
+    async def handle(self, reader, writer):
+        """ Answer one http request, the connection is closed then. """
+        try:
+            request_line = await reader.readline()
+
+            # headers are not used
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+
+            status, data = await self.respond(request_line.decode('latin-1'))
+            body = json.dumps(data, separators=(',', ':')).encode()
+
+            writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n'
+                         'Connection: close\r\n\r\n'.format(status, self.STATUS[status], len(body)).encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request_line):
+        """ Get status and data of response to request line (GET /routes?from=BTW HTTP/1.1). """
+        try:
+            method, target, _ = request_line.split()
+        except ValueError:
+            return 400, {"error": "Invalid request line."}
+
+        if method != 'GET':
+            return 405, {"error": "Only GET is allowed."}
+
+        url = urllib.parse.urlsplit(target)
+        finder = self.finder  # queries keep flights loaded when they were received
+
+        if url.path == '/count':
+            search = lambda: {"routes_count": self.count_routes(finder)}
+        elif url.path == '/routes':
+            try:
+                query = self.parse_query(url.query)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+
+            search = lambda: self.search(finder, **query)
+        else:
+            return 404, {"error": "Unknown path {}.".format(url.path)}
+
+        # searches run in threads, so the server keeps accepting requests
+        try:
+            return 200, await asyncio.get_running_loop().run_in_executor(None, search)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            sys.stderr.write('Request {} failed. {!r}\n'.format(target, e))
+
+            return 500, {"error": "Search failed."}
+
+    def count_routes(self, finder):
+        """ Get number of routes of finder flights, counted only for the first request after flights are loaded. """
+        with self.count_lock:
+            if self.routes_count is None or self.routes_count[0] is not finder:
+                self.routes_count = (finder, finder.count_routes())
+
+            return self.routes_count[1]
+
+    def parse_query(self, query_string):
+        """ Get parameters of RoutesServer.search from url query (from=BTW&bags=1). """
+        query = {}
+
+        for name, value in urllib.parse.parse_qsl(query_string, keep_blank_values=True):
+            if name not in self.QUERY_PARAMS:
+                raise ValueError("Unknown parameter {}.".format(name))
+
+            param, param_type = self.QUERY_PARAMS[name]
+
+            try:
+                query[param] = param_type(value)
+            except ValueError:
+                raise ValueError("Invalid value of parameter {}: {}.".format(name, value))
+
+        if query.get('top_k', 1) < 1:
+            raise ValueError("Parameter top_k must be at least 1.")
+
+        return query
+
+    def search(self, finder, top_k=None, **query):
+        """ Create output data of routes matching the query, same as RoutesFinder.execute. """
+        if top_k is not None:
+            top_routes = finder.top_routes(top_k, **query)
+
+            return {"top_routes": {"tickets + {} bag/s".format(pieces): [finder.route_data(route) for route in routes]
+                                   for pieces, routes in top_routes.items()}}
+
+        routes = finder.query(**query) if query else finder.search_routes()
+
+        return {"routes": [finder.route_data(route) for route in routes]}
+
+
+class Route(list):
+    """ Route (list of flight indexes) with its prices counted by the search (RoutePath.prices). """
+
+    def __init__(self, flights, prices=None):
+        super().__init__(flights)
+        self.prices = prices
+
+
+class RoutePath:
+    """ Route being searched with its state (visited airports, prices, allowed baggage)
+    updated in O(1) when a flight is added or removed.
+    """
+
+    def __init__(self, flights, from_index):
+        self.flights = flights
+        self.route = []
+        self.first_destinations = {}  # {airport: destination of the first flight from airport on route}
+        self.first_from_airport = []  # True for flights which are the first from their airport on route
+        self.tickets_prices = []      # tickets price of route up to the flight
+        self.baggage_prices = []      # price of 1 piece of baggage of route up to the flight
+        self.allowed_baggages = []    # number of allowed baggage of route up to the flight
+
+        self.push(from_index)
+
+    @property
+    def tickets_price(self):
+        return self.tickets_prices[-1]
+
+    @property
+    def baggage_price(self):
+        return self.baggage_prices[-1]
+
+    @property
+    def allowed_baggage(self):
+        return self.allowed_baggages[-1]
+
+    def prices(self):
+        """ Get price of route, same as RoutesFinder.count_price. """
+        return {'tickets_price': self.tickets_price, 'baggage_price': self.baggage_price,
+                'allowed_baggage': self.allowed_baggage}
+
+    def visited(self, index):
+        """ Ignore segments (visited airports) repetition in combination (A->B->A->B). """
+        return self.first_destinations.get(self.flights.source[index]) == self.flights.destination[index]
+
+    def push(self, index):
+        """ Add flight to the end of route. """
+        source = self.flights.source[index]
+        first_from_airport = source not in self.first_destinations
+
+        if first_from_airport:
+            self.first_destinations[source] = self.flights.destination[index]
+
+        price = float(self.flights.price[index])
+        bag_price = float(self.flights.bag_price[index])
+        bags_allowed = int(self.flights.bags_allowed[index])
+
+        if self.route:
+            price += self.tickets_price
+            bag_price += self.baggage_price
+            bags_allowed = min(bags_allowed, self.allowed_baggage)
+
+        self.route.append(index)
+        self.first_from_airport.append(first_from_airport)
+        self.tickets_prices.append(price)
+        self.baggage_prices.append(bag_price)
+        self.allowed_baggages.append(bags_allowed)
+
+    def pop(self):
+        """ Remove the last flight of route. """
+        index = self.route.pop()
+
+        if self.first_from_airport.pop():
+            del self.first_destinations[self.flights.source[index]]
+
+        self.tickets_prices.pop()
+        self.baggage_prices.pop()
+        self.allowed_baggages.pop()
+
+
+class RoutesDAG:
+    """ Routes search reusing onward routes (suffixes) of flights.
+
+    Connections always go forward in time, so flights ordered by departure are a topological order of the
+    connections graph. Onward routes from a flight depend on the route before it only through the A-B-A-B rule,
+    i.e. the first destination flown to from every visited airport. They are cached per flight and the first
+    destinations of airports which can still be visited after the flight.
+    """
+
+    def __init__(self, flights):
+        self.flights = flights
+        self.source = flights.source.tolist()
+        self.destination = flights.destination.tolist()
+        self.connections = [flights.connections(index).tolist() for index in range(len(flights))]
+
+        order = self.topological_order()
+
+        if order is None:
+            raise ValueError("Connections of flights make a cycle.")
+
+        # bitmask of airports (ids) which can be departed from on onward routes of a flight
+        self.reachable = [0] * len(flights)
+
+        for index in reversed(order):
+            for to_index in self.connections[index]:
+                self.reachable[index] |= 1 << self.source[to_index] | self.reachable[to_index]
+
+        self.suffixes_cache = {}
+        self.counts_cache = {}
+
+    def topological_order(self):
+        """ Get flight indexes ordered so that connections of every flight follow it, None if connections make a cycle.
+        Flights ordered by departure are such order unless some flight arrives before it departs.
+        """
+        if not np.any(self.flights.arrival + MIN_FLIGHT_CHANGE * 3600 <= self.flights.departure):
+            return np.argsort(self.flights.departure, kind='stable').tolist()
+
+        incoming = [0] * len(self.connections)  # number of flights connecting to a flight which are not ordered yet
+
+        for connections in self.connections:
+            for to_index in connections:
+                incoming[to_index] += 1
+
+        order = [index for index, count in enumerate(incoming) if not count]
+
+        for index in order:
+            for to_index in self.connections[index]:
+                incoming[to_index] -= 1
+
+                if not incoming[to_index]:
+                    order.append(to_index)
+
+        return order if len(order) == len(self.connections) else None
+
+    def cache_key(self, index, visited):
+        """ Key of onward routes from flight on index; only visited airports reachable from the flight matter. """
+        reachable = self.reachable[index]
+
+        return index, frozenset((airport, destination) for airport, destination in visited.items()
+                                if reachable >> airport & 1)
+
+    def onward(self, index, visited):
+        """ Generate connecting flights allowed after flight on index and visited airports after taking them.
+        :param visited: {airport: first destination from airport} of the route ending with flight on index
+        """
+        for to_index in self.connections[index]:
+            source, destination = self.source[to_index], self.destination[to_index]
+            first_destination = visited.get(source)
+
+            # ignore segments repetition in combination (A->B->A->B)
+            if first_destination == destination:
+                continue
+
+            if first_destination is None:
+                yield to_index, {**visited, source: destination}
+            else:
+                yield to_index, visited
+
+    def cached(self, cache, index, visited, combine):
+        """ Get cached value of onward routes after flight on index, computing values of onward flights first.
+        Depth first search with its own stack, so long chains of connections don't exceed the recursion limit.
+        :param combine: function([(to_index, cached value of connecting flight), ...]) returning value of flight
+        """
+        def entry(key, index, visited):
+            # [key, [(to_index, to_key, to_visited), ...], position of the next connecting flight]
+            return [key, [(to_index, self.cache_key(to_index, to_visited), to_visited)
+                          for to_index, to_visited in self.onward(index, visited)], 0]
+
+        key = self.cache_key(index, visited)
+        stack = [entry(key, index, visited)] if key not in cache else []
+
+        while stack:
+            top = stack[-1]
+            onward = top[1]
+
+            if top[2] < len(onward):
+                to_index, to_key, to_visited = onward[top[2]]
+                top[2] += 1
+
+                # connections go forward in time, so a flight is never on the stack twice
+                if to_key not in cache:
+                    stack.append(entry(to_key, to_index, to_visited))
+            else:
+                stack.pop()
+                cache[top[0]] = combine([(to_index, cache[to_key]) for to_index, to_key, _ in onward])
+
+        return cache[key]
+
+    def suffixes(self, index, visited):
+        """ Get all onward routes (tuples of flight indexes) after flight on index in search order. """
+        def combine(onward):
+            suffixes = []
+
+            for to_index, to_suffixes in onward:
+                suffixes.append((to_index,))
+                suffixes.extend((to_index,) + suffix for suffix in to_suffixes)
+
+            return suffixes
+
+        return self.cached(self.suffixes_cache, index, visited, combine)
+
+    def count_suffixes(self, index, visited):
+        """ Get number of onward routes after flight on index. """
+        return self.cached(self.counts_cache, index, visited, lambda onward: sum(1 + count for _, count in onward))
+
+    def first_visited(self, from_index):
+        return {self.source[from_index]: self.destination[from_index]}
+
+    def routes(self, from_index):
+        """ Get all routes starting with from_index flight, in the same order as RoutesFinder.find_routes. """
+        return [[from_index] + list(suffix) for suffix in self.suffixes(from_index, self.first_visited(from_index))]
+
+    def count_routes(self):
+        """ Get number of all routes without creating them. """
+        return sum(self.count_suffixes(from_index, self.first_visited(from_index))
+                   for from_index in self.flights.indexes().tolist())
+
+
+def parse_times(times):
+    """ Get seconds since epoch of times in ISO format (2017-02-11T06:25:00).
+    All times are parsed at once by numpy, without datetime.strptime for every row. Layout of times is checked first,
+    numpy would also parse dates, minutes, fractions of seconds and time zones.
+    """
+    strings = np.array(times, dtype=str)
+    layout = np.array([ord(char) for char in TIME_LAYOUT], dtype=np.uint32)
+
+    # code points of characters, shorter times are padded by zeros; a digit is less than 10 above '0', any other
+    # character of layout is equal (less than 1 above)
+    chars = strings.astype('U{}'.format(len(layout))).view(np.uint32).reshape(len(strings), len(layout))
+    valid = (chars - layout < np.where(layout == ord('0'), 10, 1).astype(np.uint32)).all(axis=1)
+
+    if strings.dtype.itemsize > chars.itemsize * len(layout):
+        valid &= np.char.str_len(strings) == len(layout)
+
+    if not valid.all():
+        raise ValueError("time data '{}' does not match format '{}'".format(strings[np.argmin(valid)], TIME_FORMAT))
+
+    # numpy parses python strings faster than its own string array
+    return np.array(times, dtype='datetime64[s]').astype(np.int64)
+
+
+class FlightTable:
+    """ Columnar store of flights; one numpy array per column, row index is the flight index. """
+
+    COLUMNS = ['source', 'destination', 'departure', 'arrival', 'flight_number', 'price', 'bags_allowed', 'bag_price']
+
+    # arrays of table saved in cache
+    ARRAYS = ['airports', 'source', 'destination', 'departure', 'arrival', 'flight_number', 'price', 'bags_allowed',
+              'bag_price', 'departure_order', 'sorted_departure', 'departure_offsets', 'arrival_order',
+              'sorted_arrival', 'arrival_offsets']
+
+    def __init__(self, source=(), destination=(), departure=(), arrival=(), flight_number=(), price=(),
+                 bags_allowed=(), bag_price=()):
+        if len(set(map(len, (source, destination, departure, arrival, flight_number, price, bags_allowed,
+                             bag_price)))) > 1:
+            raise ValueError("All flight columns must have the same length.")
+
+        # airport codes interned as small ints - airports[source[i]] is the code of flight i source (USM)
+        self.airports, airport_ids = np.unique(np.array(list(source) + list(destination), dtype=str),
+                                               return_inverse=True)
+        self.source = airport_ids[:len(source)].astype(np.int32)
+        self.destination = airport_ids[len(source):].astype(np.int32)
+
+        # seconds since epoch - 2017-02-11T06:25:00
+        self.departure = parse_times(departure)
+        self.arrival = parse_times(arrival)
+
+        self.flight_number = np.array(flight_number, dtype=str)           # unique segment identifier - PV404
+        self.price = np.array(price, dtype=np.float64)                    # flight ticket price without luggage - 24
+        self.bags_allowed = np.array(bags_allowed, dtype=np.int64)        # number of baggage to buy - 1
+        self.bag_price = np.array(bag_price, dtype=np.float64)            # price for 1 piece of baggage - 9
+
+        self.cancelled = np.zeros(len(self.source), dtype=bool)           # cancelled flights keep their index
+
+        self.index_flights()
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Flight index out of range.")
+
+        return Flight(self, index)
+
+    def save(self, directory):
+        """ Save all arrays of table (with indexes of flights) to directory, one .npy file per array. """
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """ Load table saved by save. Arrays are memory-mapped (copy-on-write) from their files. """
+        table = cls.__new__(cls)
+
+        for name in cls.ARRAYS:
+            setattr(table, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='c'))
+
+        table.cancelled = np.zeros(len(table.source), dtype=bool)
+
+        return table
+
+    def indexes(self):
+        """ Get indexes of all flights which are not cancelled. """
+        return np.flatnonzero(~self.cancelled)
+
+    def index_flights(self):
+        """ Sort flights by airport and departure/arrival time for fast lookup of connections. """
+        indexes = self.indexes()
+
+        # flight indexes ordered by (source, departure, index)
+        self.departure_order = indexes[np.lexsort((self.departure[indexes], self.source[indexes]))]
+        self.sorted_departure = self.departure[self.departure_order]
+
+        # flights departing from airport a are departure_order[departure_offsets[a]:departure_offsets[a + 1]]
+        self.departure_offsets = np.zeros(len(self.airports) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.source[indexes], minlength=len(self.airports)), out=self.departure_offsets[1:])
+
+        # flight indexes ordered by (destination, arrival, index)
+        self.arrival_order = indexes[np.lexsort((self.arrival[indexes], self.destination[indexes]))]
+        self.sorted_arrival = self.arrival[self.arrival_order]
+
+        # flights arriving to airport a are arrival_order[arrival_offsets[a]:arrival_offsets[a + 1]]
+        self.arrival_offsets = np.zeros(len(self.airports) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.destination[indexes], minlength=len(self.airports)), out=self.arrival_offsets[1:])
+
+    def airport_id(self, airport):
+        """ Get id of airport code or None for unknown airport. """
+        airport_id = np.searchsorted(self.airports, airport)
+
+        if airport_id < len(self.airports) and self.airports[airport_id] == airport:
+            return int(airport_id)
+
+        return None
+
+    def departures(self, airport, start=None, end=None):
+        """ Get indexes (in csv order) of flights departing from airport code between start and end (excluded). """
+        airport_id = self.airport_id(airport)
+
+        if airport_id is None:
+            return np.array([], dtype=np.int64)
+
+        first, last = self.departure_offsets[airport_id], self.departure_offsets[airport_id + 1]
+        departures = self.sorted_departure[first:last]
+
+        if end is not None:
+            last = first + np.searchsorted(departures, end, 'left')
+
+        if start is not None:
+            first += np.searchsorted(departures, start, 'left')
+
+        return np.sort(self.departure_order[first:last])
+
+    def arrivals(self, airport):
+        """ Get indexes (in csv order) of flights arriving to airport code. """
+        airport_id = self.airport_id(airport)
+
+        if airport_id is None:
+            return np.array([], dtype=np.int64)
+
+        return np.sort(self.arrival_order[self.arrival_offsets[airport_id]:self.arrival_offsets[airport_id + 1]])
+
+    def connections(self, index):
+        """ Get indexes (in csv order) of all flights connecting to flight on index:
+        same airport, change in 1-4 hours and at least the same number of allowed bags.
+        """
+        airport = self.destination[index]
+        start, end = self.departure_offsets[airport], self.departure_offsets[airport + 1]
+        departures = self.sorted_departure[start:end]
+
+        # departures between min and max departure time (both inclusive, same as Flight.change_possible)
+        first = start + np.searchsorted(departures, self.arrival[index] + MIN_FLIGHT_CHANGE * 3600, 'left')
+        last = start + np.searchsorted(departures, self.arrival[index] + MAX_FLIGHT_CHANGE * 3600, 'right')
+
+        candidates = self.departure_order[first:last]
+
+        return np.sort(candidates[self.bags_allowed[candidates] >= self.bags_allowed[index]])
+
+    def previous_connections(self, index):
+        """ Get indexes (in csv order) of all flights to which flight on index is connecting. """
+        airport = self.source[index]
+        start, end = self.arrival_offsets[airport], self.arrival_offsets[airport + 1]
+        arrivals = self.sorted_arrival[start:end]
+
+        first = start + np.searchsorted(arrivals, self.departure[index] - MAX_FLIGHT_CHANGE * 3600, 'left')
+        last = start + np.searchsorted(arrivals, self.departure[index] - MIN_FLIGHT_CHANGE * 3600, 'right')
+
+        candidates = self.arrival_order[first:last]
+
+        return np.sort(candidates[self.bags_allowed[candidates] <= self.bags_allowed[index]])
+
+    def extend(self, flights):
+        """ Append flights from another FlightTable; indexes of current flights don't change. """
+        airports = np.union1d(self.airports, flights.airports)
+
+        # airport ids of both tables in the merged airports
+        ids = np.searchsorted(airports, self.airports).astype(np.int32)
+        new_ids = np.searchsorted(airports, flights.airports).astype(np.int32)
+
+        self.airports = airports
+        self.source = np.concatenate((ids[self.source], new_ids[flights.source]))
+        self.destination = np.concatenate((ids[self.destination], new_ids[flights.destination]))
+
+        for column in ('departure', 'arrival', 'flight_number', 'price', 'bags_allowed', 'bag_price', 'cancelled'):
+            setattr(self, column, np.concatenate((getattr(self, column), getattr(flights, column))))
+
+        self.index_flights()
+
+    def cancel(self, indexes):
+        """ Cancel flights on indexes; they are not connecting to any flight anymore. """
+        self.cancelled[indexes] = True
+        self.index_flights()
 
 
 class Flight:
-    def __init__(self, source, destination, departure, arrival, flight_number, price, bags_allowed, bag_price):
-        self.source = source                                                    # airport code - USM
-        self.destination = destination                                          # airport code - HKT
-        self.departure = datetime.strptime(departure, '%Y-%m-%dT%H:%M:%S')      # time - 2017-02-11T06:25:00
-        self.arrival = datetime.strptime(arrival, '%Y-%m-%dT%H:%M:%S')          # time - 2017-02-11T07:25:00
-        self.flight_number = flight_number                                      # unique segment identifier - PV404
-        self.price = float(price)                                               # flight ticket price without luggage - 24
-        self.bags_allowed = int(bags_allowed)                                   # number of baggage to buy - 1
-        self.bag_price = float(bag_price)                                       # price for 1 piece of baggage - 9
-
-        self.min_departure_time = self.arrival + timedelta(hours=MIN_FLIGHT_CHANGE)
-        self.max_departure_time = self.arrival + timedelta(hours=MAX_FLIGHT_CHANGE)
+    """ Lightweight view of one flight (row) in FlightTable. """
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def source(self):
+        return str(self.table.airports[self.table.source[self.index]])
+
+    @property
+    def destination(self):
+        return str(self.table.airports[self.table.destination[self.index]])
+
+    @property
+    def departure(self):
+        return EPOCH + timedelta(seconds=int(self.table.departure[self.index]))
+
+    @property
+    def arrival(self):
+        return EPOCH + timedelta(seconds=int(self.table.arrival[self.index]))
+
+    @property
+    def flight_number(self):
+        return str(self.table.flight_number[self.index])
+
+    @property
+    def price(self):
+        return float(self.table.price[self.index])
+
+    @property
+    def bags_allowed(self):
+        return int(self.table.bags_allowed[self.index])
+
+    @property
+    def bag_price(self):
+        return float(self.table.bag_price[self.index])
+
+    @property
+    def min_departure_time(self):
+        return self.arrival + timedelta(hours=MIN_FLIGHT_CHANGE)
+
+    @property
+    def max_departure_time(self):
+        return self.arrival + timedelta(hours=MAX_FLIGHT_CHANGE)
+
+    def as_dict(self):
+        """ Get all flight data for output. """
+        return {"source": self.source,
+                "destination": self.destination,
+                "departure": self.departure,
+                "arrival": self.arrival,
+                "flight_number": self.flight_number,
+                "price": self.price,
+                "bags_allowed": self.bags_allowed,
+                "bag_price": self.bag_price,
+                "min_departure_time": self.min_departure_time,
+                "max_departure_time": self.max_departure_time}
 
     def __str__(self):
         return "#Flight: {} {} {} -> {} {}, ticket price: {}, luggage price: {} (max {} pcs)".format(self.flight_number,
@@ -202,5 +1431,12 @@ if __name__ == "__main__":
     finder = RoutesFinder()
     output = finder.execute()
 
-    print(json.dumps(output, indent=4, separators=(',', ':')))
+    if output is not None:
+        with finder.timer('serialization'):
+            output = json.dumps(output, indent=4, separators=(',', ':'))
+
+        print(output)
+
+    if finder.stats is not None:
+        sys.stderr.write(json.dumps(finder.stats.as_dict(), indent=4, separators=(',', ':')) + '\n')
 
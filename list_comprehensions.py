@@ -1,27 +1,24 @@
-def fib(n):
-    assert n >= 0
-    if n < 2:
-        return n
-    return fib(n - 1) + fib(n - 2)
+from fibonacci import fib, fib_sequence
 
+# fib is O(log n), fib_sequence gives consecutive numbers without computing every one again (see fibonacci.py)
 
 # Construct a list of the fibonacci numbers from 1 to 10 using a loop
 fibs = []
-for i in range(1, 10):
-    fibs.append(fib(i))
+for number in fib_sequence(1, 10):
+    fibs.append(number)
 print(fibs)
 
 # List comprehension
 [fib(i) for i in range(1, 10)]
 
 # Dictionary comprehension
-{i: fib(i) for i in range(1, 10)}
+{i: number for i, number in enumerate(fib_sequence(1, 10), 1)}
 
 # Set comprehension
-{fib(i) for i in range(1, 10)}
+{number for number in fib_sequence(1, 10)}
 
 # Filtering with list comprehensions
-data = [fib(i) for i in range(1, 10)]
+data = list(fib_sequence(1, 10))
 [x for x in data if x % 2 == 0]
 
 
@@ -1,4 +1,5 @@
 #Set - Unordered collection of unique hashable items
+#airports reachable within any number of flights from real flights data, see airport_reachability.py
 
 john_classes = {'monday', 'tuesday', 'wednesday'}
 eric_classes = set(['wednesday', 'thursday'])
@@ -21,7 +22,8 @@ czech_ryanair = {
 cz_dests = set([destination for destinations in czech_ryanair.values() for destination in destinations])
 print("Destinations from CZ:", cz_dests)
 
+# update the set in place, destinations | set(v) would create a new set on every iteration
 destinations = set()
 for _, v in czech_ryanair.items():
-    destinations = destinations | set(v)
-destinations
\ No newline at end of file
+    destinations.update(v)
+destinations